@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings')
+# под ASGI каждый запрос выполняет синхронный код в своём потоке, постоянные соединения с БД
+# не закрывались бы и копились по одному на поток, поэтому по умолчанию они отключены
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -1,6 +1,8 @@
 from __future__ import absolute_import, unicode_literals
+import logging
 import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown
 
 # Установка переменной окружения для настроек проекта
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings')
@@ -13,3 +15,58 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # Автоматическое обнаружение и регистрация задач из файлов tasks.py в приложениях Django
 app.autodiscover_tasks()
+
+logger = logging.getLogger(__name__)
+
+# пулы воркера, в которых задачи выполняются в зелёных нитях одного процесса
+GREEN_POOLS = ('eventlet', 'gevent')
+
+
+def configure_db_connections(pool, concurrency):
+    """
+    Настраивает соединения с БД по модели процессов воркера. В пуле prefork каждый дочерний процесс
+    держит одно постоянное соединение (CONN_MAX_AGE), закрытие соединений после задач выполняет
+    интеграция Celery с Django. В пулах eventlet и gevent у каждой зелёной нити своё соединение, которое
+    не переживает задачу, поэтому постоянные соединения отключаются
+    """
+    from django.conf import settings
+
+    if pool in GREEN_POOLS:
+        for database in settings.DATABASES.values():
+            database['CONN_MAX_AGE'] = 0
+        if concurrency > settings.CELERY_WORKER_DB_CONNECTIONS:
+            logger.warning('Пул %s с concurrency %s может открыть больше соединений с БД, чем '
+                           'CELERY_WORKER_DB_CONNECTIONS = %s', pool, concurrency,
+                           settings.CELERY_WORKER_DB_CONNECTIONS)
+    logger.info('Пул %s: до %s соединений с БД, постоянные соединения %s', pool, concurrency,
+                'отключены' if pool in GREEN_POOLS else 'включены')
+
+
+def start_metrics(pool):
+    """
+    Отдаёт метрики воркера на порту METRICS_PORT из главного процесса. В пуле prefork задачи выполняются
+    в дочерних процессах, их метрики попадают в вывод только через каталог PROMETHEUS_MULTIPROC_DIR
+    """
+    from django.conf import settings
+    from habits.metrics import start_metrics_server
+
+    if not settings.METRICS_PORT:
+        return
+    if pool == 'prefork' and 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        logger.warning('Пул prefork без PROMETHEUS_MULTIPROC_DIR: метрики задач дочерних процессов не выводятся')
+    start_metrics_server(settings.METRICS_PORT)
+    logger.info('Метрики воркера на порту %s', settings.METRICS_PORT)
+
+
+@worker_init.connect
+def on_worker_init(sender=None, **kwargs):
+    pool_cls = sender.pool_cls
+    pool = pool_cls if isinstance(pool_cls, str) else pool_cls.__module__.rsplit('.', 1)[-1]
+    configure_db_connections(pool, sender.concurrency)
+    start_metrics(pool)
+
+
+@worker_process_shutdown.connect
+def on_worker_process_shutdown(pid=None, **kwargs):
+    from habits.metrics import mark_process_dead
+    mark_process_dead(pid)
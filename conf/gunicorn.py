@@ -0,0 +1,52 @@
+"""
+Настройки gunicorn для рабочего режима: gunicorn -c conf/gunicorn.py
+
+Приложение загружается один раз в главном процессе (preload_app) вместе с подготовкой адресов
+и сериализаторов (см. habits.startup.warm_up), рабочие процессы создаются через fork.
+Метрики Prometheus рабочих процессов пишутся в файлы каталога PROMETHEUS_MULTIPROC_DIR и собираются
+по всем процессам при выводе /metrics/ (см. habits.metrics.get_registry)
+"""
+import multiprocessing
+import os
+
+wsgi_app = 'conf.wsgi:application'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# при GUNICORN_THREADS > 1 используются процессы с потоками (gthread)
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = True
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+# процесс перезапускается после max_requests запросов, разброс не даёт перезапуститься всем сразу
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+# файлы контроля работы процессов в памяти, а не на диске контейнера
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+accesslog = '-'
+
+# каталог метрик нужен до загрузки приложения: prometheus_client создаёт файлы метрик при импорте
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(worker_tmp_dir or '/tmp', 'prometheus'))
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def on_starting(server):
+    """Удаляет файлы метрик процессов прошлого запуска, вызывается один раз при запуске главного процесса"""
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    for name in os.listdir(directory):
+        if not name.endswith(f'_{os.getpid()}.db'):
+            os.remove(os.path.join(directory, name))
+
+
+def pre_fork(server, worker):
+    """Закрывает соединения главного процесса, чтобы рабочие процессы не унаследовали общие сокеты"""
+    from django.core.cache import caches
+    from django.db import connections
+    connections.close_all()
+    caches.close_all()
+
+
+def child_exit(server, worker):
+    """Убирает метрики завершившегося рабочего процесса, которые не должны его переживать"""
+    from habits.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
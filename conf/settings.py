@@ -13,6 +13,7 @@ from datetime import timedelta
 from pathlib import Path
 import os
 import dotenv
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -23,13 +24,20 @@ dotenv.load_dotenv(dotenv_path=dot_env)
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
 
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-22)b4=@hj7ye=zu*n&fhd37_o-@f2xky)cf1rp5_p+b^=&pzq$'
-
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# в режиме отладки Django хранит в памяти каждый запрос к БД, в рабочем режиме (gunicorn) DEBUG=0
+DEBUG = os.getenv("DEBUG", '1') == '1'
 
-ALLOWED_HOSTS = []
+# SECURITY WARNING: keep the secret key used in production secret!
+# ключом подписываются и JWT-токены, поэтому в рабочем режиме он обязателен,
+# а ключ для разработки подставляется только при DEBUG=1
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY:
+    if not DEBUG:
+        raise ImproperlyConfigured('Задайте SECRET_KEY в переменных окружения (.env)')
+    SECRET_KEY = 'django-insecure-22)b4=@hj7ye=zu*n&fhd37_o-@f2xky)cf1rp5_p+b^=&pzq$'
+
+ALLOWED_HOSTS = [host for host in os.getenv("ALLOWED_HOSTS", '').split(',') if host]
 
 # Application definition
 
@@ -49,7 +57,17 @@ INSTALLED_APPS = [
     'corsheaders',
 ]
 
+# DJANGO_RUNTIME=worker - профиль воркеров Celery и celery beat: загружаются только приложения с моделями
+# и задачами рассылки, без админки, сессий, сообщений, статики, документации API и CORS
+DJANGO_RUNTIME = os.getenv("DJANGO_RUNTIME", 'web')
+
+WORKER_APPS = ('django.contrib.auth', 'django.contrib.contenttypes', 'users', 'habits', 'django_celery_beat')
+
+if DJANGO_RUNTIME == 'worker':
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app in WORKER_APPS]
+
 MIDDLEWARE = [
+    'habits.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,7 +78,7 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
 ]
 
-ROOT_URLCONF = 'conf.urls'
+ROOT_URLCONF = 'conf.worker_urls' if DJANGO_RUNTIME == 'worker' else 'conf.urls'
 
 TEMPLATES = [
     {
@@ -102,9 +120,46 @@ DATABASES = {
         'PASSWORD': os.getenv("POSTGRES_PASSWORD"),
         'HOST': os.getenv("POSTGRES_HOST"),
         'PORT': os.getenv("POSTGRES_PORT"),
+        # постоянные соединения: соединение переиспользуется запросами и задачами процесса
+        # DB_CONN_MAX_AGE секунд и проверяется перед повторным использованием
+        'CONN_MAX_AGE': int(os.getenv("DB_CONN_MAX_AGE", 60)),
+        'CONN_HEALTH_CHECKS': True,
+        # через PgBouncer в режиме transaction серверные курсоры недоступны
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv("DB_PGBOUNCER") == '1',
     }
 }
 
+# Кэш, в docker используется Redis, без CACHE_URL - локальная память процесса
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+if os.getenv("CACHE_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv("CACHE_URL"),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# сколько секунд хранятся ответы публичных списков привычек, кэш также сбрасывается при их изменении
+PUBLIC_CACHE_TIMEOUT = 60 * 60
+
+# сколько секунд хранятся ответы списка и просмотра своих привычек, кэш пользователя также сбрасывается
+# при изменении его привычек
+OWNER_CACHE_TIMEOUT = 60 * 60
+
+# сколько секунд пользователь хранится в кэше аутентификации, запись также сбрасывается при изменении пользователя
+AUTH_USER_CACHE_TIMEOUT = 60
+
+# AUTH_BASIC_CACHE=1 - пароль BasicAuth проверяется один раз и результат кэшируется, иначе хеш считается
+# на каждый запрос
+AUTH_BASIC_CACHE = os.getenv("AUTH_BASIC_CACHE") == '1'
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -128,7 +183,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 LANGUAGE_CODE = 'en-us'
 
-TIME_ZONE = 'UTC'
+TIME_ZONE = 'UTC'  # время привычек задаётся в часовом поясе владельца (User.timezone), расписание хранится в UTC
 
 USE_I18N = True
 
@@ -145,6 +200,10 @@ STATICFILES_DIRS = (
 
 STATIC_ROOT = 'staticfiles'
 
+# без DEBUG статические файлы из STATIC_ROOT (документация API, админка) отдаёт само приложение,
+# SERVE_STATIC=0 - если их отдаёт отдельный веб-сервер
+SERVE_STATIC = os.getenv("SERVE_STATIC", '1') == '1'
+
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -156,11 +215,23 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
 
+# вывод JSON в API: orjson - habits.renderers.ORJSONRenderer, json - стандартный JSONRenderer DRF
+API_JSON_RENDERER = os.getenv("API_JSON_RENDERER", "orjson")
+JSON_RENDERERS = {
+    'orjson': 'habits.renderers.ORJSONRenderer',
+    'json': 'rest_framework.renderers.JSONRenderer',
+}
+
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        JSON_RENDERERS[API_JSON_RENDERER],
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
+        'users.authentication.CachedBasicAuthentication' if AUTH_BASIC_CACHE
+        else 'rest_framework.authentication.BasicAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -197,14 +268,81 @@ CELERY_TIMEZONE = "Europe/Moscow"
 # Флаг отслеживания выполнения задач
 CELERY_TASK_TRACK_STARTED = True
 
+# события задач для мониторинга, задачи рассылки добавляют в них свои метрики
+CELERY_WORKER_SEND_TASK_EVENTS = True
+
 DJANGO_CELERY_BEAT_TZ_AWARE = False  # использовать в django_celery_beat текущий часовой пояс
 
-# команда для запуска worker: celery -A conf worker -l INFO -P eventlet
+# задачи рассылки уходят в отдельную очередь, чтобы их обработчики масштабировались независимо
+CELERY_TASK_ROUTES = {
+    'habits.tasks.send_outbox': {'queue': 'reminders'},
+}
+
+# воркеры с пулом eventlet или gevent открывают соединение с БД в каждой зелёной нити, поэтому постоянные
+# соединения в них отключаются, а одновременных соединений не больше concurrency, см. conf/celery.py.
+# concurrency такого воркера нужно выбирать не больше CELERY_WORKER_DB_CONNECTIONS
+CELERY_WORKER_DB_CONNECTIONS = int(os.getenv("CELERY_WORKER_DB_CONNECTIONS", 20))
+
+# команда для запуска worker: celery -A conf worker -l INFO -P eventlet -c 20 -Q celery,reminders
 # команда для запуска beat: celery -A conf beat -l info -S django
 
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 
+# адрес Bot API, можно заменить на локальный сервер для тестов
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
+# ограничения Telegram: не больше 30 сообщений в секунду всего и 1 сообщения в секунду в один чат
+TELEGRAM_GLOBAL_RATE = 30
+TELEGRAM_CHAT_RATE = 1
+
+# максимальное число одновременных запросов к Bot API
+TELEGRAM_CONCURRENCY = 10
+
+# способ отправки: direct - каждый обработчик отправляет сам, gateway - через общий шлюз
+# (python manage.py telegram_gateway), который держит один пул соединений и общие ограничения скорости.
+# При direct ограничения скорости общие для задач одного процесса, а отправки процесса идут по очереди,
+# поэтому при нескольких процессах или воркерах ограничения Telegram соблюдает только gateway
+TELEGRAM_TRANSPORT = os.getenv("TELEGRAM_TRANSPORT", "direct")
+
+# Redis и очередь запросов шлюза, сколько секунд обработчик ждёт ответа шлюза
+TELEGRAM_GATEWAY_URL = os.getenv("TELEGRAM_GATEWAY_URL", "redis://localhost:6379/2")
+TELEGRAM_GATEWAY_QUEUE = 'telegram:gateway'
+TELEGRAM_GATEWAY_TIMEOUT = 60
+
+# метрики Prometheus: /metrics/ API доступен с адресов METRICS_ALLOWED_IPS или с заголовком
+# Authorization: Bearer <METRICS_TOKEN>. Воркеры Celery и шлюз Telegram отдают метрики на порту
+# METRICS_PORT (0 - не отдают), этот порт не нужно публиковать наружу.
+# Метрики нескольких процессов (пул prefork Celery) собираются через каталог PROMETHEUS_MULTIPROC_DIR
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_ALLOWED_IPS = [ip for ip in os.getenv("METRICS_ALLOWED_IPS", '127.0.0.1,::1').split(',') if ip]
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+
+# сколько напоминаний за раз записывает планировщик и забирает из очереди Outbox задача send_outbox
+REMINDER_BATCH_SIZE = 100
+
+# сколько задач send_outbox запускается после тика планировщика, не больше
+REMINDER_OUTBOX_WORKERS = 10
+
+# на сколько минут назад планировщик догоняет пропущенные тики
+REMINDER_MAX_CATCHUP_MINUTES = 60
+
+# повторные попытки отправки: пауза растёт вдвое от REMINDER_RETRY_BASE до REMINDER_RETRY_MAX секунд
+REMINDER_RETRY_BASE = 30
+REMINDER_RETRY_MAX = 60 * 60
+REMINDER_MAX_ATTEMPTS = 8
+
+# сколько секунд хранятся обработанные записи Outbox, должно быть больше окна догоняния планировщика
+REMINDER_OUTBOX_RETENTION = 24 * 60 * 60
+
+# языки напоминаний, шаблоны лежат в REMINDER_TEMPLATES_DIR/<язык>.json и читаются один раз при запуске
+REMINDER_LANGUAGES = (
+    ('ru', 'русский'),
+    ('en', 'английский'),
+)
+REMINDER_DEFAULT_LANGUAGE = 'ru'
+REMINDER_TEMPLATES_DIR = BASE_DIR / 'habits' / 'reminders'
+
 # настройки CORS
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:8000',  # Замените на адрес вашего фронтенд-сервера
@@ -223,4 +361,12 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'habits.tasks.check_habits_and_send',  # Путь к задаче
         'schedule': timedelta(minutes=1),  # Расписание выполнения задачи (каждую минуту)
     },
+    'refresh-schedule': {
+        'task': 'habits.tasks.refresh_habit_schedule',
+        'schedule': timedelta(hours=1),  # пересчёт расписания при переходе на летнее время
+    },
+    'compact-outbox': {
+        'task': 'habits.tasks.compact_reminder_outbox',
+        'schedule': timedelta(hours=1),  # очистка обработанных напоминаний
+    },
 }
\ No newline at end of file
@@ -1,32 +1,55 @@
+from functools import lru_cache
+
+from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
-from rest_framework import permissions
-
-from conf import settings
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="API Documentation",
-        default_version='v1',
-        description="Your API description",
-        terms_of_service="https://www.example.com/policies/terms/",
-        contact=openapi.Contact(email="contact@example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from django.urls import path, include, re_path
+from django.views.static import serve
+
+from habits.views import metrics_view
+
+
+@lru_cache(maxsize=None)
+def get_docs_view(renderer):
+    """
+    Контроллер документации API с интерфейсом renderer (swagger или redoc). drf_yasg и генерация схемы
+    импортируются при первом обращении к документации, а не при загрузке каждого процесса
+    """
+    from drf_yasg import openapi
+    from drf_yasg.views import get_schema_view
+    from rest_framework import permissions
+
+    schema_view = get_schema_view(
+        openapi.Info(
+            title="API Documentation",
+            default_version='v1',
+            description="Your API description",
+            terms_of_service="https://www.example.com/policies/terms/",
+            contact=openapi.Contact(email="contact@example.com"),
+            license=openapi.License(name="BSD License"),
+        ),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+    return schema_view.with_ui(renderer, cache_timeout=0)
+
+
+def docs_view(request, *args, renderer, **kwargs):
+    return get_docs_view(renderer)(request, *args, **kwargs)
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('habits/', include('habits.urls')),
     path('users/', include('users.urls')),
-    path('docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('docs/', docs_view, {'renderer': 'swagger'}, name='schema-swagger-ui'),
+    path('redoc/', docs_view, {'renderer': 'redoc'}, name='schema-redoc'),
+    path('metrics/', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+elif settings.SERVE_STATIC:
+    urlpatterns += [
+        re_path(rf'^{settings.STATIC_URL.lstrip("/")}(?P<path>.*)$', serve, {'document_root': settings.STATIC_ROOT}),
+    ]
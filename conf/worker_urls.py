@@ -0,0 +1,3 @@
+"""Адреса профиля воркеров (DJANGO_RUNTIME=worker): воркеры запросы не обслуживают"""
+
+urlpatterns = []
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings')
 
 application = get_wsgi_application()
+
+# DJANGO_WARM_UP=0 - без подготовки адресов и сериализаторов при загрузке, для сравнения в measure_startup
+if os.getenv('DJANGO_WARM_UP', '1') == '1':
+    from habits.startup import warm_up
+    warm_up()
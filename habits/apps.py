@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class HabitsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'habits'
+
+    def ready(self):
+        import habits.signals
+        from habits.messages import load_templates
+        load_templates()
@@ -0,0 +1,226 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from habits.caching import aget_cached_response, get_owner_scope
+
+
+# обработчики асинхронных наборов контроллеров по методам HTTP, как у маршрутизатора DRF
+LIST_ACTIONS = {'get': 'list', 'post': 'create'}
+DETAIL_ACTIONS = {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}
+
+
+class AsyncAPIView(View):
+    """
+    Асинхронный контроллер для ASGI: разбор запроса, аутентификация, проверка прав, обработка исключений
+    и вывод как у APIView DRF, который синхронных обработчиков не поддерживает. Обработчики - корутины,
+    возвращающие Response. Аутентификаторы с методом aauthenticate (см. CachedJWTAuthentication)
+    вызываются в цикле событий, остальные - через sync_to_async. Ответ выводится первым рендерером
+    из DEFAULT_RENDERER_CLASSES (JSON), без BrowsableAPIRenderer.
+    actions сопоставляет методы HTTP с обработчиками, как у ViewSet, без actions обработчик - метод
+    с именем метода HTTP
+    """
+    view_is_async = True
+    actions = None
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES
+    renderer_class = api_settings.DEFAULT_RENDERER_CLASSES[0]
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions=actions, **initkwargs)
+        # аутентификация и проверка CSRF для сессий выполняются в контроллере, как в APIView
+        view.csrf_exempt = True
+        return view
+
+    def get_authenticators(self):
+        return [authentication() for authentication in self.authentication_classes]
+
+    def get_permissions(self):
+        return [permission() for permission in self.permission_classes]
+
+    def get_serializer_context(self):
+        return {'request': self.request, 'format': None, 'view': self}
+
+    def get_handler(self, method):
+        if self.actions is not None:
+            name = self.actions.get(method)
+        else:
+            # options у View синхронный, метаданные OPTIONS не поддерживаются
+            name = method if method in self.http_method_names and method != 'options' else None
+        self.action = name
+        handler = getattr(self, name, None) if name else None
+        if handler is None:
+            raise exceptions.MethodNotAllowed(method.upper())
+        return handler
+
+    async def perform_authentication(self, request):
+        """Проверяет аутентификаторы по очереди, первый распознавший запрос задаёт пользователя"""
+        self.authenticator = None
+        for authenticator in self.get_authenticators():
+            if hasattr(authenticator, 'aauthenticate'):
+                result = await authenticator.aauthenticate(request)
+            else:
+                result = await sync_to_async(authenticator.authenticate)(request)
+            if result is not None:
+                self.authenticator = authenticator
+                request.user, request.auth = result
+                return
+        request.user, request.auth = AnonymousUser(), None
+
+    def check_permissions(self, request):
+        for permission in self.get_permissions():
+            if not permission.has_permission(request, self):
+                if self.authenticator is None and not request.user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, 'message', None),
+                                                  getattr(permission, 'code', None))
+
+    def handle_exception(self, exc):
+        """Ответ на исключение обработчиком исключений DRF, с заголовком WWW-Authenticate как в APIView"""
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            authenticators = self.get_authenticators()
+            header = authenticators[0].authenticate_header(self.request) if authenticators else None
+            if header:
+                exc.auth_header = header
+            else:
+                exc.status_code = status.HTTP_403_FORBIDDEN
+        context = {'view': self, 'args': self.args, 'kwargs': self.kwargs, 'request': self.request}
+        response = api_settings.EXCEPTION_HANDLER(exc, context)
+        if response is None:
+            raise exc
+        return response
+
+    def finalize_response(self, request, response):
+        """
+        Выводит Response рендерером и возвращает обычный HttpResponse, чтобы обработчик Django
+        не вызывал render в потоке синхронного кода
+        """
+        renderer = self.renderer_class()
+        response.accepted_renderer = renderer
+        response.accepted_media_type = renderer.media_type
+        response.renderer_context = {'view': self, 'args': self.args, 'kwargs': self.kwargs, 'request': request}
+        response.render()
+        return HttpResponse(response.content, status=response.status_code, headers=response.headers)
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args, self.kwargs = args, kwargs
+        parser_context = {'view': self, 'args': args, 'kwargs': kwargs}
+        request = Request(request, parsers=[parser() for parser in self.parser_classes],
+                          parser_context=parser_context)
+        self.request = request
+        try:
+            handler = self.get_handler(request.method.lower())
+            await self.perform_authentication(request)
+            self.check_permissions(request)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        return self.finalize_response(request, response)
+
+
+class AsyncValuesListMixin:
+    """
+    Асинхронный вариант ValuesListMixin: страница читается через queryset.values() и async ORM
+    и выводится методом from_values сериализатора
+    """
+    serializer_class = None
+    pagination_class = None
+
+    async def get_list_data(self, queryset):
+        columns = dict.fromkeys([*self.serializer_class.get_values_columns(), 'title', 'id'])
+        queryset = queryset.values(*columns)
+        if self.pagination_class is not None:
+            paginator = self.pagination_class()
+            page = await paginator.apaginate_queryset(queryset, self.request, view=self)
+            if page is not None:
+                return paginator.get_paginated_response(self.serializer_class.from_values(page)).data
+        return self.serializer_class.from_values([row async for row in queryset])
+
+
+class AsyncPublicListView(AsyncValuesListMixin, AsyncAPIView):
+    """
+    Асинхронный вариант списка публичных привычек: ответ кэшируется в области cache_scope, как
+    в CachedListMixin
+    """
+    queryset = None
+    cache_scope = None
+
+    async def get(self, request, *args, **kwargs):
+        return await aget_cached_response(request, self.cache_scope, settings.PUBLIC_CACHE_TIMEOUT,
+                                          lambda: self.get_list_data(self.queryset.all()))
+
+
+class AsyncOwnerViewSet(AsyncValuesListMixin, AsyncAPIView):
+    """
+    Асинхронный вариант ModelViewSet привычек текущего пользователя: list, create, retrieve, update,
+    partial_update и destroy (массовые операции остаются в синхронном контроллере).
+    Список и просмотр читаются через values() и кэшируются в области пользователя, как в CachedOwnerMixin,
+    запись выполняется через Model.asave и Model.adelete, поэтому сигналы перестроения расписания
+    и сброса кэша срабатывают как обычно. Проверка данных сериализатором обращается к БД
+    (ссылки на привычки), поэтому выполняется через sync_to_async
+    """
+    queryset = None
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Только привычки, принадлежащие текущему пользователю"""
+        return self.queryset.filter(owner=self.request.user)
+
+    def get_cache_scope(self):
+        return get_owner_scope(self.queryset.model, self.request.user.pk)
+
+    async def get_object(self, pk):
+        try:
+            return await self.get_queryset().aget(pk=pk)
+        except self.queryset.model.DoesNotExist:
+            raise exceptions.NotFound()
+
+    async def get_detail_data(self, pk):
+        row = await self.get_queryset().filter(pk=pk).values(*self.serializer_class.get_values_columns()).afirst()
+        if row is None:
+            raise exceptions.NotFound()
+        return self.serializer_class.from_values([row])[0]
+
+    async def validate(self, instance=None, partial=False):
+        serializer = self.serializer_class(instance, data=self.request.data, partial=partial,
+                                           context=self.get_serializer_context())
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        return serializer.validated_data
+
+    async def list(self, request, *args, **kwargs):
+        return await aget_cached_response(request, self.get_cache_scope(), settings.OWNER_CACHE_TIMEOUT,
+                                          lambda: self.get_list_data(self.get_queryset()))
+
+    async def retrieve(self, request, pk, *args, **kwargs):
+        return await aget_cached_response(request, self.get_cache_scope(), settings.OWNER_CACHE_TIMEOUT,
+                                          lambda: self.get_detail_data(pk))
+
+    async def create(self, request, *args, **kwargs):
+        """Создаёт привычку, владелец - текущий пользователь"""
+        validated_data = await self.validate()
+        instance = await self.queryset.model.objects.acreate(**{**validated_data, 'owner': request.user})
+        return Response(self.serializer_class(instance).data, status=status.HTTP_201_CREATED)
+
+    async def update(self, request, pk, *args, partial=False, **kwargs):
+        instance = await self.get_object(pk)
+        for field, value in (await self.validate(instance, partial)).items():
+            setattr(instance, field, value)
+        await instance.asave()
+        return Response(self.serializer_class(instance).data)
+
+    async def partial_update(self, request, pk, *args, **kwargs):
+        return await self.update(request, pk, *args, partial=True, **kwargs)
+
+    async def destroy(self, request, pk, *args, **kwargs):
+        instance = await self.get_object(pk)
+        await instance.adelete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
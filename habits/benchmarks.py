@@ -0,0 +1,77 @@
+import json
+import re
+import statistics
+import time
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from habits.telegram import DeliveryResult
+
+
+def summarize(timings, elapsed=None):
+    """Сводка по списку длительностей в секундах: число, запросов в секунду и перцентили в мс"""
+    elapsed = elapsed if elapsed is not None else sum(timings)
+    cuts = statistics.quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+    return {
+        'count': len(timings),
+        'rps': round(len(timings) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(cuts[49] * 1000, 3),
+        'p95_ms': round(cuts[94] * 1000, 3),
+        'p99_ms': round(cuts[98] * 1000, 3),
+        'max_ms': round(max(timings) * 1000, 3),
+    }
+
+
+def measure(func, repeat, prepare=None):
+    """
+    Вызывает func(number) repeat раз и возвращает сводку summarize по длительностям вызовов.
+    prepare(number) вызывается перед каждым вызовом и в замер не входит
+    """
+    timings = []
+    started_at = time.perf_counter()
+    for number in range(repeat):
+        if prepare is not None:
+            prepare(number)
+        call_started_at = time.perf_counter()
+        func(number)
+        timings.append(time.perf_counter() - call_started_at)
+    return summarize(timings, sum(timings) if prepare is not None else time.perf_counter() - started_at)
+
+
+def fake_send_telegram_messages(messages):
+    """Заглушка отправки в Telegram: все сообщения считаются доставленными без сетевых запросов"""
+    return [DeliveryResult(chat_id, True, None, None, 0.0) for chat_id, text in messages]
+
+
+@contextmanager
+def offline_reminders():
+    """
+    Рассылка без брокера и без Telegram: задачи send_outbox не ставятся в очередь, очередь Outbox
+    разбирается вызовом drain_outbox в текущем процессе, а отправка сообщений заменяется заглушкой
+    """
+    with patch('habits.tasks.send_outbox.delay'), \
+            patch('habits.services.send_telegram_messages', fake_send_telegram_messages):
+        yield
+
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def parse_importtime(text):
+    """
+    Разбирает вывод python -X importtime в словарь {пакет верхнего уровня: собственное время импорта
+    его модулей в мс}, пакеты упорядочены по убыванию времени
+    """
+    packages = {}
+    for line in text.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            package = match[4].split('.')[0]
+            packages[package] = packages.get(package, 0) + int(match[1]) / 1000
+    return dict(sorted(((name, round(ms, 2)) for name, ms in packages.items()), key=lambda item: -item[1]))
+
+
+def write_results(results, path):
+    """Записывает результаты замеров в JSON-файл path для сравнения между версиями"""
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
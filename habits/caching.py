@@ -0,0 +1,136 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+
+from habits.models import Habit, NiceHabit
+
+
+# области кэша публичных списков привычек
+PUBLIC_HABITS = 'public_habits'
+PUBLIC_NICE_HABITS = 'public_nice_habits'
+
+PUBLIC_SCOPES = {Habit: PUBLIC_HABITS, NiceHabit: PUBLIC_NICE_HABITS}
+
+
+def get_owner_scope(model, owner_id):
+    """Область кэша привычек модели model пользователя owner_id"""
+    return f'{model._meta.model_name}:owner:{owner_id}'
+
+
+def get_version_key(scope):
+    """Ключ версии области кэша scope"""
+    return f'version:{scope}'
+
+
+def get_cache_version(scope):
+    """Возвращает текущую версию области кэша scope"""
+    return cache.get_or_set(get_version_key(scope), 1, timeout=None)
+
+
+async def aget_cache_version(scope):
+    """Асинхронный вариант get_cache_version"""
+    return await cache.aget_or_set(get_version_key(scope), 1, timeout=None)
+
+
+def bump_cache_version(scope):
+    """Увеличивает версию области кэша scope, после чего все её прежние записи перестают читаться"""
+    try:
+        cache.incr(get_version_key(scope))
+    except ValueError:
+        cache.set(get_version_key(scope), 1, timeout=None)
+
+
+def make_etag(data):
+    """Вычисляет ETag по содержимому ответа"""
+    return quote_etag(hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest())
+
+
+def get_owner_scopes(model, instances):
+    """
+    Области кэша привычек модели model владельцев instances. Полезные привычки выводятся вместе
+    с описанием приятной привычки, поэтому для приятных привычек в них входят и области полезных
+    привычек всех пользователей, которые на них ссылаются
+    """
+    owner_ids = {instance.owner_id for instance in instances}
+    scopes = {get_owner_scope(model, owner_id) for owner_id in owner_ids}
+    if model is NiceHabit:
+        owner_ids |= set(Habit.objects.filter(nice_habit__in=instances).values_list('owner_id', flat=True).distinct())
+        scopes |= {get_owner_scope(Habit, owner_id) for owner_id in owner_ids}
+    return scopes
+
+
+def invalidate_owner_cache(model, instances):
+    """Сбрасывает кэш привычек модели model владельцев instances (см. get_owner_scopes)"""
+    for scope in get_owner_scopes(model, instances):
+        bump_cache_version(scope)
+
+
+def get_cached_response(request, scope, timeout, get_data):
+    """
+    Возвращает ответ из кэша по полному адресу запроса (с параметрами страницы) в версионируемой
+    области scope, при промахе получает данные вызовом get_data. Поддерживает проверку ETag
+    через If-None-Match
+    """
+    key = f'{scope}:{get_cache_version(scope)}:{request.build_absolute_uri()}'
+    cached = cache.get(key)
+    if cached is None:
+        data = get_data()
+        cached = (data, make_etag(data))
+        cache.set(key, cached, timeout)
+    return make_cached_response(request, *cached)
+
+
+async def aget_cached_response(request, scope, timeout, get_data):
+    """Асинхронный вариант get_cached_response, get_data - корутинная функция"""
+    key = f'{scope}:{await aget_cache_version(scope)}:{request.build_absolute_uri()}'
+    cached = await cache.aget(key)
+    if cached is None:
+        data = await get_data()
+        cached = (data, make_etag(data))
+        await cache.aset(key, cached, timeout)
+    return make_cached_response(request, *cached)
+
+
+def make_cached_response(request, data, etag):
+    """Ответ с данными и ETag или 304, если клиент передал совпадающий If-None-Match"""
+    # DRF импортируется при первом ответе: сигналы сброса кэша загружаются и в воркерах Celery
+    from rest_framework.response import Response
+
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return Response(data, headers={'ETag': etag})
+
+
+class CachedListMixin:
+    """
+    Примесь для ListAPIView, кэширующая ответ списка по полному адресу запроса (с параметрами страницы)
+    в версионируемой области cache_scope и поддерживающая проверку ETag через If-None-Match
+    """
+    cache_scope = None
+
+    def list(self, request, *args, **kwargs):
+        return get_cached_response(request, self.cache_scope, settings.PUBLIC_CACHE_TIMEOUT,
+                                   lambda: super(CachedListMixin, self).list(request, *args, **kwargs).data)
+
+
+class CachedOwnerMixin:
+    """
+    Примесь для ModelViewSet привычек, кэширующая ответы списка и просмотра в области кэша текущего
+    пользователя (см. get_owner_scope). Версия области увеличивается при любом изменении привычек
+    пользователя, поэтому сброс кэша не зависит от числа закэшированных страниц
+    """
+
+    def get_cache_scope(self):
+        return get_owner_scope(self.get_queryset().model, self.request.user.pk)
+
+    def list(self, request, *args, **kwargs):
+        return get_cached_response(request, self.get_cache_scope(), settings.OWNER_CACHE_TIMEOUT,
+                                   lambda: super(CachedOwnerMixin, self).list(request, *args, **kwargs).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return get_cached_response(request, self.get_cache_scope(), settings.OWNER_CACHE_TIMEOUT,
+                                   lambda: super(CachedOwnerMixin, self).retrieve(request, *args, **kwargs).data)
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from functools import lru_cache
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+from habits.metrics import observe_delivery
+from habits.telegram import DeliveryResult, TelegramDelivery
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_reply_key(queue, request_id):
+    """Ключ списка Redis, в который шлюз кладёт ответ на запрос request_id"""
+    return f'{queue}:reply:{request_id}'
+
+
+class GatewayClient:
+    """
+    Отправка сообщений через шлюз telegram_gateway. Запрос кладётся в очередь Redis, ответ со списком
+    результатов ожидается в отдельном ключе не дольше timeout секунд. Интерфейс как у TelegramDelivery:
+    deliver(messages) возвращает список DeliveryResult в том же порядке
+    """
+
+    def __init__(self, url=None, queue=None, timeout=None):
+        self.redis = redis.Redis.from_url(url or settings.TELEGRAM_GATEWAY_URL)
+        self.queue = queue or settings.TELEGRAM_GATEWAY_QUEUE
+        self.timeout = timeout or settings.TELEGRAM_GATEWAY_TIMEOUT
+
+    def deliver(self, messages):
+        messages = list(messages)
+        if not messages:
+            return []
+        request_id = uuid.uuid4().hex
+        self.redis.rpush(self.queue, json.dumps({
+            'id': request_id,
+            'deadline': time.time() + self.timeout,
+            'messages': messages,
+        }))
+        reply = self.redis.blpop([get_reply_key(self.queue, request_id)], timeout=self.timeout)
+        if reply is None:
+            # шлюз не ответил, сообщения считаются неотправленными и будут отправлены повторно,
+            # в метриках шлюза их нет, поэтому они учитываются здесь
+            results = [DeliveryResult(chat_id, False, None, 'Шлюз не ответил', self.timeout) for chat_id, _ in messages]
+            observe_delivery(results)
+            return results
+        return [DeliveryResult(*result) for result in json.loads(reply[1])]
+
+
+@lru_cache(maxsize=None)
+def get_gateway_client():
+    """Клиент шлюза с одним пулом соединений Redis на процесс"""
+    return GatewayClient()
+
+
+class TelegramGateway:
+    """
+    Шлюз исходящих сообщений Telegram для всех обработчиков рассылки. Принимает запросы из очереди Redis
+    и отправляет их через один пул keep-alive соединений с общими ограничениями скорости на токен бота:
+    общим и на каждый чат (см. TelegramDelivery). Запросы обрабатываются параллельно, запросы, которые
+    клиент перестал ждать, пропускаются. Метрики отправки учитываются в шлюзе, а не в клиенте
+    """
+
+    def __init__(self, url=None, queue=None, delivery=None):
+        self.redis = aioredis.Redis.from_url(url or settings.TELEGRAM_GATEWAY_URL)
+        self.queue = queue or settings.TELEGRAM_GATEWAY_QUEUE
+        self.delivery = delivery or TelegramDelivery()
+
+    async def handle(self, client, semaphore, payload):
+        """Отправляет сообщения одного запроса и кладёт результаты в ключ ответа"""
+        request = json.loads(payload)
+        if request['deadline'] < time.time():
+            logger.warning('Запрос %s пропущен: клиент перестал ждать ответ', request['id'])
+            return
+        results = await self.delivery.send_batch(client, semaphore, request['messages'])
+        observe_delivery(results)
+        reply_key = get_reply_key(self.queue, request['id'])
+        await self.redis.rpush(reply_key, json.dumps(results))
+        await self.redis.expireat(reply_key, int(request['deadline']) + 1)
+
+    async def serve(self, stop=None):
+        """Принимает запросы, пока не установлено событие stop"""
+        stop = stop or asyncio.Event()
+        semaphore = asyncio.Semaphore(self.delivery.concurrency)
+        tasks = set()
+        async with self.delivery.client() as client:
+            while not stop.is_set():
+                item = await self.redis.blpop([self.queue], timeout=1)
+                if item is None:
+                    continue
+                task = asyncio.create_task(self.handle(client, semaphore, item[1]))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        await self.redis.aclose()
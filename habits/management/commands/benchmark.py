@@ -0,0 +1,179 @@
+import platform
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from habits.benchmarks import measure, offline_reminders, summarize, write_results
+from habits.caching import (PUBLIC_HABITS, PUBLIC_NICE_HABITS, bump_cache_version, get_owner_scope,
+                            get_version_key)
+from habits.models import Habit, HabitSchedule, NiceHabit, SchedulerState
+from habits.seeding import seed_habits
+from habits.services import drain_outbox, run_habits
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Заполняет БД тестовыми данными, замеряет запросы в секунду и перцентили задержки API '
+            'и время одного тика рассылки, записывает результаты в JSON. Работает без сети и Telegram')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500, help='количество пользователей')
+        parser.add_argument('--habits', type=int, default=10, help='полезных привычек на пользователя')
+        parser.add_argument('--requests', type=int, default=200, help='запросов на каждый адрес API')
+        parser.add_argument('--ticks', type=int, default=20, help='количество тиков рассылки')
+        parser.add_argument('--seed', type=int, default=0, help='зерно генератора случайных чисел')
+        parser.add_argument('--output', default='benchmark.json', help='файл для результатов в JSON')
+        parser.add_argument('--keep', action='store_true', help='не удалять созданные записи')
+
+    def benchmark_cache(self):
+        """
+        Кэш по умолчанию с отдельным префиксом ключей на время замеров: записи и версии областей кэша
+        бенчмарка не пересекаются с общим кэшем, поэтому его не нужно очищать
+        """
+        prefix = f'benchmark:{uuid.uuid4().hex}'
+        return override_settings(CACHES={**settings.CACHES,
+                                         'default': {**settings.CACHES['default'], 'KEY_PREFIX': prefix}})
+
+    def get_read_urls(self, client, owner, repeat, rnd):
+        """Адреса запросов чтения для каждого замера, заранее выбранные для repeat запросов"""
+        own_ids = list(Habit.objects.filter(owner=owner).values_list('id', flat=True))
+        public_count = Habit.objects.filter(is_public=True).count()
+        public_url = reverse('habits:public_useful_habit_list')
+        cursor_urls = [f'{public_url}?pagination=cursor']
+        while len(cursor_urls) < repeat:
+            next_url = client.get(cursor_urls[-1]).data['next']
+            cursor_urls.append(next_url or cursor_urls[0])
+        return {
+            'useful_list': [reverse('habits:useful-list')] * repeat,
+            'useful_retrieve': [reverse('habits:useful-detail', args=[rnd.choice(own_ids)]) for _ in range(repeat)],
+            'nice_list': [reverse('habits:nice-list')] * repeat,
+            'public_useful_offset': [f'{public_url}?limit=5&offset={rnd.randrange(max(public_count - 5, 1))}'
+                                     for _ in range(repeat)],
+            'public_useful_cursor': cursor_urls,
+            'public_nice_list': [reverse('habits:public_nice_habit_list')] * repeat,
+        }
+
+    def bench_api(self, owners, repeat, rnd):
+        """
+        Замеры адресов API от имени одного из созданных пользователей. Запросы чтения замеряются
+        без кэша (версии областей кэша увеличиваются перед каждым запросом) и с кэшем (тот же адрес
+        запрашивается перед замером)
+        """
+        client = APIClient(SERVER_NAME='localhost')
+        owner = owners[len(owners) // 2]
+        client.force_authenticate(owner)
+        scopes = [get_owner_scope(Habit, owner.pk), get_owner_scope(NiceHabit, owner.pk),
+                  PUBLIC_HABITS, PUBLIC_NICE_HABITS]
+        habit_data = {'title': 'Benchmark', 'time': '08:00:00', 'action': 'run', 'period': '12345',
+                      'durations': 60, 'reward': 'banana'}
+        created_ids = []
+
+        def invalidate(number):
+            for scope in scopes:
+                bump_cache_version(scope)
+
+        def create(number):
+            response = client.post(reverse('habits:useful-list'), habit_data, format='json')
+            created_ids.append(response.data['id'])
+
+        results = {}
+        with self.benchmark_cache():
+            for name, urls in self.get_read_urls(client, owner, repeat, rnd).items():
+                def read(number, urls=urls):
+                    client.get(urls[number])
+
+                results[f'{name}_cold'] = measure(read, repeat, prepare=invalidate)
+                results[f'{name}_warm'] = measure(read, repeat, prepare=read)
+            results.update({
+                'useful_create': measure(create, repeat),
+                'useful_update': measure(
+                    lambda number: client.patch(reverse('habits:useful-detail', args=[created_ids[number]]),
+                                                {'title': f'Benchmark {number}'}, format='json'),
+                    repeat
+                ),
+                'useful_delete': measure(
+                    lambda number: client.delete(reverse('habits:useful-detail', args=[created_ids[number]])),
+                    repeat
+                ),
+            })
+            # версии областей хранятся без срока, записи страниц истекают сами
+            cache.delete_many([get_version_key(scope) for scope in scopes])
+        return results
+
+    def bench_scheduler(self, ticks):
+        """Замеры тиков рассылки в самые загруженные минуты недели вместе с разбором очереди Outbox"""
+        busiest = HabitSchedule.objects.values('minute_of_week').order_by().annotate(
+            habits=Count('id')
+        ).order_by('-habits')[:ticks]
+        monday = datetime(2023, 8, 21)
+        timings, queries, habits = [], [], []
+        with offline_reminders():
+            for slot in busiest:
+                # каждый тик замеряется как одна минута, без догоняния от предыдущего тика
+                SchedulerState.objects.all().delete()
+                moment = monday + timedelta(minutes=slot['minute_of_week'])
+                with CaptureQueriesContext(connection) as context:
+                    started_at = time.perf_counter()
+                    run_habits(moment)
+                    while any(drain_outbox().values()):
+                        pass
+                    timings.append(time.perf_counter() - started_at)
+                queries.append(len(context.captured_queries))
+                habits.append(slot['habits'])
+        if not timings:
+            return {}
+        result = summarize(timings)
+        del result['rps']
+        result.update({
+            'habits_per_tick_max': max(habits),
+            'queries_per_tick_max': max(queries),
+            'queries_per_tick_avg': round(sum(queries) / len(queries), 1),
+        })
+        return result
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        with transaction.atomic():
+            started_at = time.perf_counter()
+            owners = seed_habits(users=options['users'], habits_per_user=options['habits'], seed=options['seed'])
+            seed_time = time.perf_counter() - started_at
+            with connection.cursor() as cursor:
+                for model in (User, Habit, NiceHabit, HabitSchedule):
+                    cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+            results = {
+                'meta': {
+                    'started_at': datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'users': options['users'],
+                    'habits_per_user': options['habits'],
+                    'requests': options['requests'],
+                    'seed': options['seed'],
+                    'seed_seconds': round(seed_time, 2),
+                },
+                'api': self.bench_api(owners, options['requests'], rnd),
+                'scheduler': self.bench_scheduler(options['ticks']),
+            }
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        for group in ('api', 'scheduler'):
+            self.stdout.write(self.style.MIGRATE_HEADING(group))
+            items = results[group].items() if group == 'api' else [('tick', results[group])]
+            for name, values in items:
+                self.stdout.write(f'{name:26} ' + ', '.join(f'{key}={value}' for key, value in values.items()))
+        write_results(results, options['output'])
+        self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {options["output"]}'))
@@ -0,0 +1,107 @@
+import asyncio
+import random
+import time
+from unittest.mock import patch
+
+import httpx
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from habits.benchmarks import summarize, write_results
+from habits.models import Habit
+from habits.seeding import seed_habits
+from users.models import User
+
+
+# адреса синхронных и асинхронных контроллеров для одних и тех же запросов
+ENDPOINTS = {
+    'sync': ('habits:useful-list', 'habits:useful-detail', 'habits:public_useful_habit_list'),
+    'async': ('habits:async_useful-list', 'habits:async_useful-detail', 'habits:async_public_useful_habit_list'),
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает синхронные и асинхронные контроллеры под ASGI в одном процессе: запросов в секунду '
+            'и перцентили задержки при разном числе одновременных запросов. Кэш отключается, чтобы каждый '
+            'запрос обращался к БД. Созданные записи удаляются после замеров')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='количество пользователей')
+        parser.add_argument('--habits', type=int, default=20, help='полезных привычек на пользователя')
+        parser.add_argument('--requests', type=int, default=300, help='запросов на каждый замер')
+        parser.add_argument('--concurrency', default='1,10,50', help='числа одновременных запросов через запятую')
+        parser.add_argument('--seed', type=int, default=0, help='зерно генератора случайных чисел')
+        parser.add_argument('--output', help='файл для результатов в JSON')
+
+    def get_urls(self, mode, owner, rnd, count):
+        """Смесь списка своих привычек, просмотра своей привычки и публичного списка со смещением"""
+        list_name, detail_name, public_name = ENDPOINTS[mode]
+        own_ids = list(Habit.objects.filter(owner=owner).values_list('id', flat=True))
+        public_count = Habit.objects.filter(is_public=True).count()
+        urls = []
+        for number in range(count):
+            kind = number % 3
+            if kind == 0:
+                urls.append(reverse(list_name))
+            elif kind == 1:
+                urls.append(reverse(detail_name, args=[rnd.choice(own_ids)]))
+            else:
+                urls.append(f'{reverse(public_name)}?limit=5&offset={rnd.randrange(max(public_count - 5, 1))}')
+        return urls
+
+    async def run(self, client, urls, headers, concurrency):
+        """Выполняет запросы urls в concurrency одновременных потоков запросов и возвращает сводку"""
+        pending = iter(urls)
+        timings = []
+
+        async def worker():
+            for url in pending:
+                started_at = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                timings.append(time.perf_counter() - started_at)
+                if response.status_code != 200:
+                    raise CommandError(f'{url}: {response.status_code} {response.text[:200]}')
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return summarize(timings, time.perf_counter() - started_at)
+
+    async def bench(self, url_sets, headers, levels):
+        application = get_asgi_application()
+        transport = httpx.ASGITransport(app=application)
+        results = {}
+        async with httpx.AsyncClient(transport=transport, base_url='http://localhost') as client:
+            for mode, urls in url_sets.items():
+                # прогрев: соединение с БД, импорты и планы запросов
+                await self.run(client, urls[:10], headers, 1)
+                results[mode] = {str(level): await self.run(client, urls, headers, level) for level in levels}
+        return results
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        rnd = random.Random(options['seed'])
+        # записи создаются вне транзакции: запросы ASGI выполняются в потоке со своим соединением
+        owners = seed_habits(users=options['users'], habits_per_user=options['habits'], seed=options['seed'])
+        try:
+            owner = owners[len(owners) // 2]
+            headers = {'Authorization': f'Bearer {AccessToken.for_user(owner)}'}
+            url_sets = {mode: self.get_urls(mode, owner, rnd, options['requests']) for mode in ENDPOINTS}
+            # постоянные соединения отключены, как в conf/asgi.py
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}), \
+                    patch.dict(settings.DATABASES['default'], CONN_MAX_AGE=0):
+                results = asyncio.run(self.bench(url_sets, headers, levels))
+        finally:
+            User.objects.filter(pk__in=[owner.pk for owner in owners]).delete()
+
+        self.stdout.write(self.style.MIGRATE_HEADING('ASGI, один процесс (sync - DRF, async - AsyncAPIView)'))
+        for mode, by_level in results.items():
+            for level, values in by_level.items():
+                summary = ', '.join(f'{key}={value}' for key, value in values.items())
+                self.stdout.write(f'{mode:6} x{level:<4} {summary}')
+        if options['output']:
+            write_results(results, options['output'])
+            self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {options["output"]}'))
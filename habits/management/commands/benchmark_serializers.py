@@ -0,0 +1,66 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from habits.benchmarks import measure, write_results
+from habits.models import Habit, NiceHabit
+from habits.renderers import ORJSONRenderer
+from habits.seeding import seed_habits
+from habits.serializers import HabitSerializer, NiceHabitSerializer, PublicHabitSerializer
+
+
+class Command(BaseCommand):
+    help = ('Замеряет стоимость вывода списков привычек на 1000 записей: чтение из БД, сериализация и JSON '
+            'через ModelSerializer и JSONRenderer и через values() и ORJSONRenderer. Данные создаются '
+            'во временной транзакции')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--habits', type=int, default=1000, help='полезных привычек в выборке')
+        parser.add_argument('--repeat', type=int, default=20, help='повторов каждого замера')
+        parser.add_argument('--seed', type=int, default=0, help='зерно генератора случайных чисел')
+        parser.add_argument('--output', help='файл для результатов в JSON')
+
+    def bench(self, serializer_class, queryset, repeat):
+        """Замеры по этапам для одного сериализатора, медиана в мс на 1000 записей"""
+        count = queryset.count()
+        columns = serializer_class.get_values_columns()
+        instances = list(queryset)
+        rows = list(queryset.values(*columns))
+        data = serializer_class(instances, many=True).data
+        values = serializer_class.from_values(rows)
+
+        stages = {
+            'query': (lambda number: list(queryset.all()), lambda number: list(queryset.values(*columns))),
+            'serialize': (lambda number: serializer_class(instances, many=True).data,
+                          lambda number: serializer_class.from_values(rows)),
+            'render': (lambda number: JSONRenderer().render(data), lambda number: ORJSONRenderer().render(values)),
+        }
+        result = {}
+        for stage, (before, after) in stages.items():
+            for name, func in (('before', before), ('after', after)):
+                result[f'{stage}_{name}_ms'] = round(measure(func, repeat)['p50_ms'] * 1000 / count, 3)
+        for name in ('before', 'after'):
+            result[f'total_{name}_ms'] = round(sum(result[f'{stage}_{name}_ms'] for stage in stages), 3)
+        result['speedup'] = round(result['total_before_ms'] / result['total_after_ms'], 1)
+        return result
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            seed_habits(users=max(options['habits'] // 100, 1), habits_per_user=min(options['habits'], 100),
+                        seed=options['seed'])
+            results = {
+                'habits': self.bench(HabitSerializer, Habit.objects.select_related('nice_habit'),
+                                     options['repeat']),
+                'nice_habits': self.bench(NiceHabitSerializer, NiceHabit.objects.all(), options['repeat']),
+                'public_habits': self.bench(PublicHabitSerializer, Habit.objects.filter(is_public=True),
+                                            options['repeat']),
+            }
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('мс на 1000 записей, медиана (before - ModelSerializer и json, '
+                                                     'after - values() и orjson)'))
+        for name, values in results.items():
+            self.stdout.write(f'{name:16} ' + ', '.join(f'{key}={value}' for key, value in values.items()))
+        if options['output']:
+            write_results(results, options['output'])
+            self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {options["output"]}'))
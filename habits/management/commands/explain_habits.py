@@ -0,0 +1,78 @@
+import statistics
+import time
+from datetime import datetime
+
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from habits.models import Habit, HabitSchedule, NiceHabit, Outbox
+from habits.paginators import KeysetPagination
+from habits.seeding import seed_habits
+from habits.services import get_due_slots
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Заполняет БД тестовыми привычками и выводит планы EXPLAIN ANALYZE и время основных запросов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='количество пользователей')
+        parser.add_argument('--habits', type=int, default=10, help='полезных привычек на пользователя')
+        parser.add_argument('--repeat', type=int, default=20, help='повторов каждого запроса для замера')
+        parser.add_argument('--seed', type=int, default=0, help='зерно генератора случайных чисел')
+        parser.add_argument('--keep', action='store_true', help='не удалять созданные записи')
+
+    def get_cursor_queryset(self, queryset, offset):
+        """Запрос страницы пагинатора с курсором на запись queryset с номером offset"""
+        paginator = KeysetPagination()
+        paginator.base_url = '/'
+        position = queryset.order_by(*paginator.ordering)[offset:offset + 1].first()
+        url = paginator.encode_cursor(position, False) if position else '/'
+        request = Request(APIRequestFactory().get(url, SERVER_NAME='localhost'))
+        return paginator.get_page_queryset(queryset, request)
+
+    def get_queries(self, owner):
+        """Запросы, повторяющие основные пути доступа к привычкам"""
+        moment = datetime(2023, 8, 21, 8, 0)
+        return [
+            ('список привычек владельца', Habit.objects.filter(owner=owner)[:5]),
+            ('публичный список, offset', Habit.objects.filter(is_public=True)[100:105]),
+            ('публичный список, курсор', self.get_cursor_queryset(Habit.objects.filter(is_public=True), 100)),
+            ('приятные привычки владельца', NiceHabit.objects.filter(owner=owner)[:5]),
+            ('слот расписания', get_due_slots(moment, moment)),
+            ('пачка рассылки', Outbox.objects.filter(
+                status=Outbox.PENDING, next_attempt_at__lte=moment
+            ).order_by('next_attempt_at').values_list('id', 'chat_id', 'text', 'attempts')[:100]),
+        ]
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            started_at = time.perf_counter()
+            owners = seed_habits(users=options['users'], habits_per_user=options['habits'], seed=options['seed'])
+            self.stdout.write(f'Создано пользователей: {len(owners)}, '
+                              f'за {time.perf_counter() - started_at:.1f} с')
+            with connection.cursor() as cursor:
+                for model in (User, Habit, NiceHabit, HabitSchedule):
+                    cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+            for name, queryset in self.get_queries(owners[len(owners) // 2]):
+                timings = []
+                for _ in range(options['repeat']):
+                    started_at = time.perf_counter()
+                    list(queryset.all())
+                    timings.append((time.perf_counter() - started_at) * 1000)
+                plan = queryset.explain(analyze=True)
+                # записи, отброшенные фильтром, и полный просмотр таблицы значат, что индекс не покрывает условие
+                filtered = 'Rows Removed by Filter' in plan or 'Seq Scan' in plan
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self.stdout.write(plan)
+                style = self.style.WARNING if filtered else self.style.SUCCESS
+                self.stdout.write(style(
+                    f'фильтр или полный просмотр: {"есть" if filtered else "нет"}, '
+                    f'медиана {statistics.median(timings):.2f} мс, максимум {max(timings):.2f} мс\n'
+                ))
+
+            if not options['keep']:
+                transaction.set_rollback(True)
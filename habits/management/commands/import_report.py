@@ -0,0 +1,77 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from habits.benchmarks import parse_importtime, write_results
+
+
+# что загружает процесс каждого профиля при старте: DJANGO_RUNTIME и выполняемый код
+PROFILES = {
+    'web': ('web', 'import conf.wsgi'),
+    'worker': ('worker', 'import conf, django; django.setup(); import habits.tasks'),
+}
+
+
+class Command(BaseCommand):
+    help = ('Отчёт о времени импорта при старте веб-процесса и воркера Celery (python -X importtime): '
+            'общее время и самые медленные пакеты. С --baseline сравнивает с прошлым отчётом и показывает '
+            'новые пакеты, с --max-increase завершается с ошибкой при росте времени импорта')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help='запусков каждого профиля, берётся медиана')
+        parser.add_argument('--top', type=int, default=15, help='сколько пакетов показывать')
+        parser.add_argument('--baseline', help='JSON прошлого отчёта для сравнения')
+        parser.add_argument('--max-increase', type=float, help='допустимый рост общего времени, %%')
+        parser.add_argument('--output', help='файл для отчёта в JSON')
+
+    def measure(self, runtime, code):
+        """Один запуск профиля, возвращает время импорта по пакетам"""
+        env = {**os.environ, 'DJANGO_RUNTIME': runtime, 'DEBUG': '0', 'ALLOWED_HOSTS': 'localhost'}
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=settings.BASE_DIR,
+                                   env=env, capture_output=True, text=True)
+        if completed.returncode:
+            raise CommandError(completed.stderr[-2000:])
+        return parse_importtime(completed.stderr)
+
+    def handle(self, *args, **options):
+        report = {}
+        for name, (runtime, code) in PROFILES.items():
+            runs = sorted((self.measure(runtime, code) for _ in range(options['repeat'])),
+                          key=lambda packages: sum(packages.values()))
+            packages = runs[len(runs) // 2]
+            report[name] = {
+                'total_ms': round(statistics.median(sum(run.values()) for run in runs), 1),
+                'packages': packages,
+            }
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+
+        regressions = []
+        for name, result in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{name}: {result["total_ms"]} мс, '
+                                                         f'пакетов {len(result["packages"])}'))
+            for package, ms in list(result['packages'].items())[:options['top']]:
+                self.stdout.write(f'  {package:28} {ms:8.1f} мс')
+            if baseline and name in baseline:
+                before = baseline[name]
+                change = (result['total_ms'] - before['total_ms']) / before['total_ms'] * 100
+                self.stdout.write(f'  изменение к {options["baseline"]}: {change:+.1f}%')
+                added = [package for package in result['packages'] if package not in before['packages']]
+                if added:
+                    self.stdout.write(self.style.WARNING(f'  новые пакеты: {", ".join(added)}'))
+                if options['max_increase'] is not None and change > options['max_increase']:
+                    regressions.append(f'{name} {change:+.1f}%')
+
+        if options['output']:
+            write_results(report, options['output'])
+            self.stdout.write(self.style.SUCCESS(f'Отчёт записан в {options["output"]}'))
+        if regressions:
+            raise CommandError(f'Время импорта выросло больше {options["max_increase"]}%: {", ".join(regressions)}')
@@ -0,0 +1,89 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from habits.benchmarks import write_results
+
+
+# выполняется в отдельном процессе интерпретатора, как при запуске рабочего процесса без --preload
+STARTUP_SCRIPT = '''
+import json, resource, sys, time
+from wsgiref.util import setup_testing_defaults
+
+started_at = time.perf_counter()
+import conf.wsgi
+loaded_at = time.perf_counter()
+if sys.argv[1] == '1':
+    from habits.startup import warm_up
+    warm_up()
+warmed_at = time.perf_counter()
+
+
+def request(path):
+    environ = {'PATH_INFO': path, 'HTTP_HOST': 'localhost'}
+    setup_testing_defaults(environ)
+    request_started_at = time.perf_counter()
+    response = conf.wsgi.application(environ, lambda status, headers: None)
+    b''.join(response)
+    response.close()
+    return time.perf_counter() - request_started_at
+
+
+paths = sys.argv[2:]
+first = [request(path) for path in paths]
+second = [request(path) for path in paths]
+print(json.dumps({
+    'load_ms': (loaded_at - started_at) * 1000,
+    'warm_up_ms': (warmed_at - loaded_at) * 1000,
+    'first_requests_ms': sum(first) * 1000,
+    'next_requests_ms': sum(second) * 1000,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+'''
+
+# адреса первых запросов: ответы без аутентификации проходят разбор адреса, middleware и контроллеры DRF,
+# асинхронный контроллер и документацию API
+PATHS = ('/habits/public/useful/', '/habits/async/public/nice/', '/users/token/', '/docs/')
+
+
+class Command(BaseCommand):
+    help = ('Замеряет холодный старт рабочего процесса: запуск интерпретатора и загрузку conf.wsgi, '
+            'подготовку адресов и сериализаторов (habits.startup.warm_up) и время первых запросов '
+            'с подготовкой и без неё. Каждый замер - отдельный процесс с DEBUG=0')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='запусков процесса в каждом режиме')
+        parser.add_argument('--output', help='файл для результатов в JSON')
+
+    def start(self, warm_up):
+        """Один запуск процесса, возвращает замеры из процесса и общее время от запуска до ответа"""
+        env = {**os.environ, 'DEBUG': '0', 'DJANGO_WARM_UP': '0', 'ALLOWED_HOSTS': 'localhost'}
+        started_at = time.perf_counter()
+        completed = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, str(int(warm_up)), *PATHS],
+                                   cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        elapsed = time.perf_counter() - started_at
+        if completed.returncode:
+            raise CommandError(completed.stderr)
+        result = json.loads(completed.stdout.splitlines()[-1])
+        result['process_ms'] = elapsed * 1000
+        return result
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, warm_up in (('cold', False), ('warm_up', True)):
+            runs = [self.start(warm_up) for _ in range(options['repeat'])]
+            results[name] = {key: round(statistics.median(run[key] for run in runs), 1) for key in runs[0]}
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'старт рабочего процесса, медиана из {options["repeat"]}, '
+                                                     f'первые запросы: {", ".join(PATHS)}'))
+        for name, values in results.items():
+            self.stdout.write(f'{name:8} ' + ', '.join(f'{key}={value}' for key, value in values.items()))
+        if options['output']:
+            write_results(results, options['output'])
+            self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {options["output"]}'))
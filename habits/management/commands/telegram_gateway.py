@@ -0,0 +1,38 @@
+import asyncio
+import signal
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from habits.gateway import TelegramGateway
+from habits.metrics import start_metrics_server
+
+
+class Command(BaseCommand):
+    help = ('Запускает шлюз исходящих сообщений Telegram: принимает запросы обработчиков рассылки из Redis '
+            'и отправляет их через общий пул соединений с общими ограничениями скорости. '
+            'Обработчики отправляют через шлюз при TELEGRAM_TRANSPORT = "gateway"')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=settings.TELEGRAM_GATEWAY_URL, help='адрес Redis')
+        parser.add_argument('--queue', default=settings.TELEGRAM_GATEWAY_QUEUE, help='очередь запросов в Redis')
+        parser.add_argument('--metrics-port', type=int, default=settings.METRICS_PORT,
+                            help='порт вывода метрик Prometheus, 0 - не выводить')
+
+    async def run(self, gateway):
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        await gateway.serve(stop)
+
+    def handle(self, *args, **options):
+        gateway = TelegramGateway(url=options['url'], queue=options['queue'])
+        if options['metrics_port']:
+            start_metrics_server(options['metrics_port'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Шлюз Telegram слушает очередь {gateway.queue}: не больше {gateway.delivery.global_rate} сообщений '
+            f'в секунду, {gateway.delivery.chat_rate} в секунду на чат'
+        ))
+        asyncio.run(self.run(gateway))
+        self.stdout.write('Шлюз Telegram остановлен')
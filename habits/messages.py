@@ -0,0 +1,51 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+
+
+# максимальная длина текста одного сообщения Telegram
+MESSAGE_LIMIT = 4096
+
+# шаблоны напоминаний по языкам, заполняются load_templates при запуске приложения
+TEMPLATES = {}
+
+
+def load_templates(directory=None):
+    """Читает шаблоны напоминаний языков REMINDER_LANGUAGES из файлов <язык>.json каталога directory"""
+    directory = Path(directory or settings.REMINDER_TEMPLATES_DIR)
+    for language, _ in settings.REMINDER_LANGUAGES:
+        with open(directory / f'{language}.json', encoding='utf-8') as file:
+            TEMPLATES[language] = json.load(file)
+
+
+def render_message(kind, habit, language=None):
+    """
+    Формирует текст напоминания о полезной (useful) или приятной (nice) привычке habit по шаблону
+    языка language. Пустые место и вознаграждение в текст не попадают
+    """
+    templates = TEMPLATES.get(language) or TEMPLATES[settings.REMINDER_DEFAULT_LANGUAGE]
+    place = templates['place'].format(place=habit.place) if habit.place else ''
+    reward = getattr(habit, 'reward', None)
+    reward = templates['reward'].format(reward=reward) if reward else ''
+    return templates[kind].format(action=habit.action, place=place, durations=habit.durations, reward=reward)
+
+
+def split_message(texts, limit=MESSAGE_LIMIT):
+    """
+    Объединяет тексты напоминаний одного получателя в сообщения не длиннее limit символов,
+    тексты разделяются пустой строкой. Текст длиннее limit режется на части
+    """
+    messages, current = [], ''
+    for text in texts:
+        for start in range(0, len(text), limit):
+            part = text[start:start + limit]
+            if current and len(current) + 2 + len(part) <= limit:
+                current += '\n\n' + part
+            else:
+                if current:
+                    messages.append(current)
+                current = part
+    if current:
+        messages.append(current)
+    return messages
@@ -0,0 +1,82 @@
+import os
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, multiprocess, start_http_server
+
+
+# рассылка напоминаний
+TICK_MESSAGES = Histogram(
+    'reminder_tick_messages', 'Сообщений поставлено в очередь рассылки за один тик',
+    buckets=(0, 10, 100, 1000, 10000, 100000, 1000000)
+)
+TICK_SECONDS = Histogram(
+    'reminder_tick_seconds', 'Время выбора привычек и постановки задач рассылки за один тик'
+)
+TICK_LAG_SECONDS = Histogram(
+    'reminder_tick_lag_seconds', 'Отставание тика от самой ранней минуты, напоминания которой он поставил в очередь',
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 900, 3600)
+)
+MESSAGES = Counter('telegram_messages', 'Сообщений отправлено в Telegram', ['status'])
+SEND_SECONDS = Histogram(
+    'telegram_send_seconds', 'Время ответа Telegram Bot API на одно сообщение',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+# запросы к API
+REQUEST_SECONDS = Histogram('http_request_seconds', 'Время обработки запроса к API', ['view', 'method'])
+REQUEST_QUERIES = Histogram(
+    'http_request_queries', 'Запросов к БД на один запрос к API', ['view', 'method'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+
+# соединения с БД
+DB_CONNECTIONS = Counter(
+    'db_connections', 'Запросов к API, начатых с уже открытым (reused="true") или без соединения с БД',
+    ['reused']
+)
+
+
+def observe_tick(messages, seconds, lag):
+    """
+    Учитывает один тик рассылки: число сообщений в очереди, длительность и отставание в секундах.
+    Отставание None (тик ничего не поставил в очередь) не учитывается
+    """
+    TICK_MESSAGES.observe(messages)
+    TICK_SECONDS.observe(seconds)
+    if lag is not None:
+        TICK_LAG_SECONDS.observe(max(lag, 0))
+
+
+def observe_delivery(results):
+    """Учитывает результаты отправки DeliveryResult: счётчики успешных и неудачных отправок и задержки"""
+    sent = failed = 0
+    for result in results:
+        if result.ok:
+            sent += 1
+        else:
+            failed += 1
+        SEND_SECONDS.observe(result.latency)
+    MESSAGES.labels('sent').inc(sent)
+    MESSAGES.labels('failed').inc(failed)
+
+
+def get_registry():
+    """
+    Реестр метрик для вывода. При PROMETHEUS_MULTIPROC_DIR каждый процесс пишет метрики в свои файлы
+    в этом каталоге, и реестр при каждом выводе собирает их по всем процессам
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def start_metrics_server(port):
+    """Отдаёт метрики на порту port из отдельного потока, для процессов без API: воркеров Celery и шлюза"""
+    start_http_server(port, registry=get_registry())
+
+
+def mark_process_dead(pid):
+    """Убирает метрики завершившегося процесса pid, которые не должны переживать процесс"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
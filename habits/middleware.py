@@ -0,0 +1,53 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+
+from habits.metrics import DB_CONNECTIONS, REQUEST_QUERIES, REQUEST_SECONDS
+
+
+class MetricsMiddleware:
+    """
+    Учитывает время обработки и число запросов к БД для каждого запроса к API, а также было ли
+    к началу запроса открыто постоянное соединение с БД (см. CONN_MAX_AGE).
+    Запросы к БД считаются через execute_wrapper, без включения отладочного журнала запросов.
+    Под ASGI работает асинхронно, чтобы не переводить асинхронные контроллеры в поток синхронного кода,
+    и учитывает только время: запросы к БД выполняются в других потоках со своими соединениями
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        DB_CONNECTIONS.labels(str(connection.connection is not None).lower()).inc()
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        started_at = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        self.observe(request, started_at, queries[0])
+        return response
+
+    async def __acall__(self, request):
+        started_at = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, started_at)
+        return response
+
+    def observe(self, request, started_at, queries=None):
+        resolver_match = request.resolver_match
+        if resolver_match is not None:
+            view, method = resolver_match.view_name, request.method
+            REQUEST_SECONDS.labels(view, method).observe(time.perf_counter() - started_at)
+            if queries is not None:
+                REQUEST_QUERIES.labels(view, method).observe(queries)
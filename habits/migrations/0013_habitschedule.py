@@ -0,0 +1,50 @@
+# Generated by Django 4.2.4 on 2026-10-17 18:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 1000
+
+
+def fill_schedule(apps, schema_editor):
+    """Заполняет индекс расписания для уже существующих привычек, слоты записываются пачками по BATCH_SIZE"""
+    Habit = apps.get_model('habits', 'Habit')
+    NiceHabit = apps.get_model('habits', 'NiceHabit')
+    HabitSchedule = apps.get_model('habits', 'HabitSchedule')
+    slots = []
+    for model, field in ((Habit, 'habit'), (NiceHabit, 'nice_habit')):
+        for habit in model.objects.filter(time__isnull=False).iterator(chunk_size=BATCH_SIZE):
+            minutes = {
+                (int(week_day) - 1) * 24 * 60 + habit.time.hour * 60 + habit.time.minute
+                for week_day in set(habit.period) if week_day in '1234567'
+            }
+            slots += [HabitSchedule(minute_of_week=minute, **{field: habit}) for minute in minutes]
+            if len(slots) >= BATCH_SIZE:
+                HabitSchedule.objects.bulk_create(slots, batch_size=BATCH_SIZE)
+                slots = []
+    HabitSchedule.objects.bulk_create(slots, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0012_nicehabit_period'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HabitSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minute_of_week', models.PositiveSmallIntegerField(db_index=True, verbose_name='минута недели')),
+                ('habit', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='schedule', to='habits.habit', verbose_name='полезная привычка')),
+                ('nice_habit', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='schedule', to='habits.nicehabit', verbose_name='приятная привычка')),
+            ],
+            options={
+                'verbose_name': 'слот расписания',
+                'verbose_name_plural': 'расписание',
+            },
+        ),
+        migrations.RunPython(fill_schedule, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.4 on 2026-10-17 18:33
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def fill_weekdays(apps, schema_editor):
+    """
+    Заполняет битовую маску дней недели из строки period у существующих привычек,
+    привычки записываются пачками по BATCH_SIZE
+    """
+    for model_name in ('Habit', 'NiceHabit'):
+        model = apps.get_model('habits', model_name)
+        habits = []
+        for habit in model.objects.only('id', 'period').iterator(chunk_size=BATCH_SIZE):
+            habit.weekdays = sum(1 << (int(day) - 1) for day in set(habit.period or '') if day in '1234567')
+            habits.append(habit)
+            if len(habits) >= BATCH_SIZE:
+                model.objects.bulk_update(habits, ['weekdays'], batch_size=BATCH_SIZE)
+                habits = []
+        model.objects.bulk_update(habits, ['weekdays'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0013_habitschedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='weekdays',
+            field=models.PositiveSmallIntegerField(default=127, editable=False, verbose_name='дни недели (битовая маска)'),
+        ),
+        migrations.AddField(
+            model_name='nicehabit',
+            name='weekdays',
+            field=models.PositiveSmallIntegerField(default=127, editable=False, verbose_name='дни недели (битовая маска)'),
+        ),
+        migrations.RunPython(fill_weekdays, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.4 on 2026-10-17 18:39
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0014_weekdays'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='habit',
+            options={'ordering': ('title', 'id'), 'verbose_name': 'полезная привычка', 'verbose_name_plural': 'полезные привычки'},
+        ),
+        migrations.AlterModelOptions(
+            name='nicehabit',
+            options={'ordering': ('title', 'id'), 'verbose_name': 'приятная привычка', 'verbose_name_plural': 'приятные привычки'},
+        ),
+    ]
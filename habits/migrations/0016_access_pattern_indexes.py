@@ -0,0 +1,29 @@
+# Generated by Django 4.2.4 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0015_ordering_title_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(fields=['owner', 'title', 'id'], name='habit_owner_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['title', 'id'], name='habit_public_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='nicehabit',
+            index=models.Index(fields=['owner', 'title', 'id'], name='nicehabit_owner_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='nicehabit',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['title', 'id'], name='nicehabit_public_title_idx'),
+        ),
+    ]
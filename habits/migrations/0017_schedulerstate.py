@@ -0,0 +1,25 @@
+# Generated by Django 4.2.4 on 2026-10-17 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0016_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=30, unique=True, verbose_name='планировщик')),
+                ('last_minute', models.DateTimeField(blank=True, null=True, verbose_name='последняя обработанная минута')),
+            ],
+            options={
+                'verbose_name': 'состояние планировщика',
+                'verbose_name_plural': 'состояния планировщиков',
+            },
+        ),
+    ]
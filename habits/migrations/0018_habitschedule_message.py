@@ -0,0 +1,73 @@
+# Generated by Django 4.2.4 on 2026-10-17 18:48
+
+from django.db import migrations, models
+
+
+# шаблоны напоминаний на момент миграции: миграция не зависит от текущих habits/reminders/*.json
+TEMPLATES = {
+    'ru': {
+        'useful': 'Выполните: {action}{place}, у вас есть {durations} секунд.{reward}',
+        'nice': 'Насладитесь: {action}{place}, у вас есть {durations} секунд.',
+        'place': ' {place}',
+        'reward': ' Ваша награда: {reward}',
+    },
+    'en': {
+        'useful': 'Time to {action}{place}, you have {durations} seconds.{reward}',
+        'nice': 'Enjoy: {action}{place}, you have {durations} seconds.',
+        'place': ' {place}',
+        'reward': ' Your reward: {reward}',
+    },
+}
+DEFAULT_LANGUAGE = 'ru'
+BATCH_SIZE = 1000
+
+
+def render_message(kind, habit, language):
+    """Текст напоминания как у habits.messages.render_message на момент миграции"""
+    templates = TEMPLATES.get(language) or TEMPLATES[DEFAULT_LANGUAGE]
+    place = templates['place'].format(place=habit.place) if habit.place else ''
+    reward = getattr(habit, 'reward', None)
+    reward = templates['reward'].format(reward=reward) if reward else ''
+    return templates[kind].format(action=habit.action, place=place, durations=habit.durations, reward=reward)
+
+
+def fill_messages(apps, schema_editor):
+    """
+    Заполняет telegram id владельца и текст напоминания в уже существующих слотах расписания.
+    Слоты записываются пачками по BATCH_SIZE, у привычек без владельца chat_id остаётся пустым
+    """
+    HabitSchedule = apps.get_model('habits', 'HabitSchedule')
+    slots = HabitSchedule.objects.select_related('habit__owner', 'nice_habit__owner')
+    batch = []
+    for slot in slots.iterator(chunk_size=BATCH_SIZE):
+        kind, habit = ('useful', slot.habit) if slot.habit_id else ('nice', slot.nice_habit)
+        owner = habit.owner if habit.owner_id else None
+        slot.chat_id = owner.telegram if owner else None
+        slot.text = render_message(kind, habit, owner.language if owner else None)
+        batch.append(slot)
+        if len(batch) >= BATCH_SIZE:
+            HabitSchedule.objects.bulk_update(batch, ['chat_id', 'text'], batch_size=BATCH_SIZE)
+            batch = []
+    HabitSchedule.objects.bulk_update(batch, ['chat_id', 'text'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0017_schedulerstate'),
+        ('users', '0006_user_language'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habitschedule',
+            name='chat_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='telegram id владельца'),
+        ),
+        migrations.AddField(
+            model_name='habitschedule',
+            name='text',
+            field=models.TextField(blank=True, default='', verbose_name='текст напоминания'),
+        ),
+        migrations.RunPython(fill_messages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.4 on 2026-10-17 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0018_habitschedule_message'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Outbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='ключ')),
+                ('chat_id', models.BigIntegerField(verbose_name='telegram id получателя')),
+                ('text', models.TextField(verbose_name='текст')),
+                ('status', models.CharField(choices=[('pending', 'ожидает отправки'), ('sent', 'отправлено'), ('failed', 'не отправлено')], default='pending', max_length=10, verbose_name='состояние')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='неудачных попыток')),
+                ('next_attempt_at', models.DateTimeField(verbose_name='следующая попытка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='поставлено в очередь')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='отправлено')),
+                ('error', models.TextField(blank=True, default='', verbose_name='ошибка')),
+            ],
+            options={
+                'verbose_name': 'исходящее напоминание',
+                'verbose_name_plural': 'исходящие напоминания',
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['next_attempt_at'], name='outbox_pending_idx'), models.Index(condition=models.Q(('status', 'pending'), _negated=True), fields=['created_at'], name='outbox_done_idx')],
+            },
+        ),
+    ]
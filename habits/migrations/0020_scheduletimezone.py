@@ -0,0 +1,25 @@
+# Generated by Django 4.2.4 on 2026-10-17 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0019_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleTimezone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timezone', models.CharField(max_length=63, unique=True, verbose_name='часовой пояс')),
+                ('utc_offset', models.IntegerField(verbose_name='смещение от UTC в минутах')),
+            ],
+            options={
+                'verbose_name': 'смещение часового пояса расписания',
+                'verbose_name_plural': 'смещения часовых поясов расписания',
+            },
+        ),
+    ]
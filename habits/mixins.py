@@ -0,0 +1,135 @@
+from django.db import transaction
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from habits.caching import PUBLIC_SCOPES, bump_cache_version, invalidate_owner_cache
+from habits.models import NiceHabit, period_to_weekdays
+from habits.services import build_schedules
+
+
+class ValuesListMixin:
+    """
+    Примесь для списков привычек: страница читается через queryset.values() и выводится методом
+    from_values сериализатора (см. ValuesSerializerMixin), без создания объектов моделей.
+    Колонки title и id нужны курсору постраничного вывода
+    """
+
+    def list(self, request, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        columns = dict.fromkeys([*serializer_class.get_values_columns(), 'title', 'id'])
+        queryset = self.filter_queryset(self.get_queryset()).values(*columns)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer_class.from_values(page))
+        return Response(serializer_class.from_values(queryset))
+
+
+class BulkHabitMixin:
+    """
+    Примесь для ModelViewSet привычек, добавляющая массовые операции по адресу <список>/bulk/:
+        POST - создание списка привычек,
+        PATCH - частичное изменение списка привычек, каждый элемент содержит id,
+        DELETE - удаление привычек по списку id.
+    Все элементы проверяются за один проход, при ошибках возвращается список ошибок по элементам
+    в порядке запроса и ничего не сохраняется. Запись выполняется bulk_create/bulk_update в одной транзакции
+    """
+    bulk_select_related = ('owner',)
+
+    def get_bulk_items(self, request):
+        """Возвращает список элементов из тела запроса или None, если передан не список"""
+        return request.data if isinstance(request.data, list) else None
+
+    def get_bulk_context(self, items):
+        """Контекст сериализатора с заранее загруженными приятными привычками из элементов запроса"""
+        context = self.get_serializer_context()
+        ids = {item.get('nice_habit') for item in items if isinstance(item, dict)} - {None, ''}
+        try:
+            context['nice_habits'] = NiceHabit.objects.in_bulk([int(pk) for pk in ids])
+        except (TypeError, ValueError):
+            pass
+        return context
+
+    def save_bulk(self, habits, created):
+        """Пересчитывает вычисляемые поля и сохраняет привычки, перестраивает их расписание и сбрасывает кэш"""
+        model = self.get_queryset().model
+        for habit in habits:
+            habit.weekdays = period_to_weekdays(habit.period)
+        with transaction.atomic():
+            if created:
+                habits = model.objects.bulk_create(habits)
+            else:
+                fields = {field for habit in habits for field in habit._bulk_fields} | {'weekdays'}
+                model.objects.bulk_update(habits, fields)
+            build_schedules(habits)
+        if any(habit.is_public or getattr(habit, '_was_public', False) for habit in habits):
+            bump_cache_version(PUBLIC_SCOPES[model])
+        invalidate_owner_cache(model, habits)
+        return habits
+
+    def bulk_error(self, message):
+        return Response({'non_field_errors': [message]}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request, *args, **kwargs):
+        """Массовое создание привычек, владелец задаётся до записи в БД"""
+        items = self.get_bulk_items(request)
+        if items is None:
+            return self.bulk_error('Ожидается список привычек')
+        serializer = self.get_serializer_class()(data=items, many=True, context=self.get_bulk_context(items))
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        model = self.get_queryset().model
+        habits = [model(**{**attrs, 'owner': request.user}) for attrs in serializer.validated_data]
+        habits = self.save_bulk(habits, created=True)
+        return Response(self.get_serializer(habits, many=True).data, status=status.HTTP_201_CREATED)
+
+    @bulk.mapping.patch
+    def bulk_update(self, request, *args, **kwargs):
+        """Массовое частичное изменение привычек текущего пользователя"""
+        items = self.get_bulk_items(request)
+        if items is None or not all(isinstance(item, dict) for item in items):
+            return self.bulk_error('Ожидается список привычек с полем id')
+        instances = self.get_queryset().select_related(*self.bulk_select_related).in_bulk(
+            [item['id'] for item in items if isinstance(item.get('id'), int)]
+        )
+        context = self.get_bulk_context(items)
+
+        habits, errors = [], []
+        for item in items:
+            habit = instances.get(item.get('id'))
+            if habit is None:
+                errors.append({'id': ['Привычка не найдена']})
+                continue
+            serializer = self.get_serializer_class()(habit, data=item, partial=True, context=context)
+            if not serializer.is_valid():
+                errors.append(serializer.errors)
+                continue
+            habit._was_public = habit.is_public
+            habit._bulk_fields = set(serializer.validated_data) - {'owner'}
+            for field, value in serializer.validated_data.items():
+                if field != 'owner':
+                    setattr(habit, field, value)
+            habits.append(habit)
+            errors.append({})
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        habits = self.save_bulk(habits, created=False)
+        return Response(self.get_serializer(habits, many=True).data)
+
+    @bulk.mapping.delete
+    def bulk_destroy(self, request, *args, **kwargs):
+        """Массовое удаление привычек текущего пользователя по списку id"""
+        ids = self.get_bulk_items(request)
+        if ids is None or not all(isinstance(pk, int) for pk in ids):
+            return self.bulk_error('Ожидается список id привычек')
+        queryset = self.get_queryset().filter(id__in=ids)
+        found = set(queryset.values_list('id', flat=True))
+        errors = [{} if pk in found else {'id': ['Привычка не найдена']} for pk in ids]
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            queryset.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
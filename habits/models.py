@@ -1,10 +1,22 @@
+from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from conf import settings
 
 
 NULLABLE = {'blank': True, 'null': True}
 
+WEEK_DAYS = '1234567'
+
+
+def period_to_weekdays(period):
+    """Переводит строку period с номерами дней недели в 7-битную маску, бит 0 - понедельник"""
+    return sum(1 << (int(day) - 1) for day in set(str(period or '')) if day in WEEK_DAYS)
+
+
+def weekdays_to_days(weekdays):
+    """Возвращает список номеров дней недели (1-7), установленных в маске weekdays"""
+    return [int(day) for day in WEEK_DAYS if weekdays & (1 << (int(day) - 1))]
+
 
 class NiceHabit(models.Model):
     """
@@ -19,6 +31,10 @@ class NiceHabit(models.Model):
         time: TimeField, время для действия, секунды должны быть 00
         is_public: BooleanField, default=False, признак публичности привычки, если True, привычку могут
         просматривать все пользователи ресурса
+        period: CharField, max_length=7, default='1234567' периодичность действия
+
+    Вычисляемые поля:
+        weekdays: PositiveSmallIntegerField, битовая маска дней недели из period, бит 0 - понедельник
     """
     title = models.CharField(max_length=30, verbose_name='название')
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, **NULLABLE,
@@ -31,6 +47,8 @@ class NiceHabit(models.Model):
         default='1234567',
         verbose_name='периодичность'
     )
+    weekdays = models.PositiveSmallIntegerField(default=0b1111111, editable=False,
+                                                verbose_name='дни недели (битовая маска)')
     durations = models.SmallIntegerField(default=120,
                                          validators=[MaxValueValidator(120), MinValueValidator(1)],
                                          verbose_name='продолжительность')
@@ -39,11 +57,23 @@ class NiceHabit(models.Model):
     class Meta:
         verbose_name = 'приятная привычка'
         verbose_name_plural = 'приятные привычки'
-        ordering = ('title', )
+        ordering = ('title', 'id')
+        indexes = [
+            # список привычек владельца с сортировкой по названию
+            models.Index(fields=['owner', 'title', 'id'], name='nicehabit_owner_title_idx'),
+            # публичный список, индексируются только публичные привычки
+            models.Index(fields=['title', 'id'], condition=models.Q(is_public=True),
+                         name='nicehabit_public_title_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        """Пересчитывает битовую маску дней недели из строки period"""
+        self.weekdays = period_to_weekdays(self.period)
+        super().save(*args, **kwargs)
+
 
 class Habit(models.Model):
     """
@@ -64,6 +94,9 @@ class Habit(models.Model):
         одно из двух полей reward или nice_habit
         is_public: BooleanField, default=False, признак публичности привычки, если True, привычку могут
         просматривать все пользователи ресурса
+
+    Вычисляемые поля:
+        weekdays: PositiveSmallIntegerField, битовая маска дней недели из period, бит 0 - понедельник
     """
     title = models.CharField(max_length=30, verbose_name='название')
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, **NULLABLE,
@@ -82,6 +115,8 @@ class Habit(models.Model):
         default='1234567',
         verbose_name='периодичность'
     )
+    weekdays = models.PositiveSmallIntegerField(default=0b1111111, editable=False,
+                                                verbose_name='дни недели (битовая маска)')
     reward = models.CharField(max_length=100, **NULLABLE, verbose_name='вознаграждение')
     durations = models.SmallIntegerField(
         default=120,
@@ -93,8 +128,142 @@ class Habit(models.Model):
     class Meta:
         verbose_name = 'полезная привычка'
         verbose_name_plural = 'полезные привычки'
-        ordering = ('title', )
+        ordering = ('title', 'id')
+        indexes = [
+            # список привычек владельца с сортировкой по названию
+            models.Index(fields=['owner', 'title', 'id'], name='habit_owner_title_idx'),
+            # публичный список, индексируются только публичные привычки
+            models.Index(fields=['title', 'id'], condition=models.Q(is_public=True),
+                         name='habit_public_title_idx'),
+        ]
 
 
     def __str__(self):
         return self.title
+
+    def save(self, *args, **kwargs):
+        """Пересчитывает битовую маску дней недели из строки period"""
+        self.weekdays = period_to_weekdays(self.period)
+        super().save(*args, **kwargs)
+
+
+class HabitSchedule(models.Model):
+    """
+    Индекс расписания напоминаний, поддерживается сигналами при сохранении привычек.
+    Каждая запись - одна минута недели, в которую нужно отправить напоминание о привычке.
+
+    Поля:
+        minute_of_week: PositiveSmallIntegerField, номер минуты недели от 0 (понедельник 00:00)
+        до 10079 (воскресенье 23:59)
+        habit: ForeignKey(Habit) полезная привычка, заполнено одно из двух полей habit или nice_habit
+        nice_habit: ForeignKey(NiceHabit) приятная привычка, заполнено одно из двух полей habit или nice_habit
+        chat_id: BigIntegerField, telegram id владельца на момент построения слота
+        text: TextField, готовый текст напоминания на языке владельца
+    """
+    minute_of_week = models.PositiveSmallIntegerField(db_index=True, verbose_name='минута недели')
+    habit = models.ForeignKey(Habit, on_delete=models.CASCADE, **NULLABLE, related_name='schedule',
+                              verbose_name='полезная привычка')
+    nice_habit = models.ForeignKey(NiceHabit, on_delete=models.CASCADE, **NULLABLE, related_name='schedule',
+                                   verbose_name='приятная привычка')
+    chat_id = models.BigIntegerField(**NULLABLE, verbose_name='telegram id владельца')
+    text = models.TextField(blank=True, default='', verbose_name='текст напоминания')
+
+    class Meta:
+        verbose_name = 'слот расписания'
+        verbose_name_plural = 'расписание'
+
+    def __str__(self):
+        return f'{self.minute_of_week}'
+
+
+class SchedulerState(models.Model):
+    """
+    Состояние планировщика рассылки, одна запись на планировщик.
+
+    Поля:
+        name: CharField, max_length=30, уникальное имя планировщика
+        last_minute: DateTimeField, последняя обработанная минута по UTC (отметка уровня), с неё
+        планировщик продолжает рассылку после пропущенных или опоздавших тиков
+    """
+    name = models.CharField(max_length=30, unique=True, verbose_name='планировщик')
+    last_minute = models.DateTimeField(**NULLABLE, verbose_name='последняя обработанная минута')
+
+    class Meta:
+        verbose_name = 'состояние планировщика'
+        verbose_name_plural = 'состояния планировщиков'
+
+    def __str__(self):
+        return f'{self.name}: {self.last_minute}'
+
+
+class ScheduleTimezone(models.Model):
+    """
+    Смещение от UTC, с которым построены слоты расписания владельцев из часового пояса, одна запись на пояс.
+    По нему refresh_schedule перестраивает расписание пояса один раз после каждого перехода
+    на летнее или зимнее время.
+
+    Поля:
+        timezone: CharField, max_length=63, уникальное название часового пояса IANA
+        utc_offset: IntegerField, смещение от UTC в минутах
+    """
+    timezone = models.CharField(max_length=63, unique=True, verbose_name='часовой пояс')
+    utc_offset = models.IntegerField(verbose_name='смещение от UTC в минутах')
+
+    class Meta:
+        verbose_name = 'смещение часового пояса расписания'
+        verbose_name_plural = 'смещения часовых поясов расписания'
+
+    def __str__(self):
+        return f'{self.timezone}: {self.utc_offset}'
+
+
+class Outbox(models.Model):
+    """
+    Очередь исходящих напоминаний (transactional outbox). Записи создаются планировщиком
+    в одной транзакции с отметкой SchedulerState и разбираются обработчиками рассылки.
+
+    Поля:
+        key: CharField, max_length=100, уникальный ключ сообщения (telegram id получателя, минута,
+        номер части сообщения): напоминания получателя за минуту объединяются в одно сообщение,
+        которое при превышении лимита длины делится на части. Ключ не даёт поставить сообщение в очередь дважды
+        chat_id: BigIntegerField, telegram id получателя
+        text: TextField, текст сообщения
+        status: CharField, состояние: ожидает отправки, отправлено или отправка не удалась
+        attempts: PositiveSmallIntegerField, число неудачных попыток отправки
+        next_attempt_at: DateTimeField, не раньше какого момента по UTC делать следующую попытку
+        created_at: DateTimeField, когда напоминание поставлено в очередь
+        sent_at: DateTimeField, когда напоминание доставлено
+        error: TextField, описание последней ошибки отправки
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'ожидает отправки'),
+        (SENT, 'отправлено'),
+        (FAILED, 'не отправлено'),
+    )
+
+    key = models.CharField(max_length=100, unique=True, verbose_name='ключ')
+    chat_id = models.BigIntegerField(verbose_name='telegram id получателя')
+    text = models.TextField(verbose_name='текст')
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING, verbose_name='состояние')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='неудачных попыток')
+    next_attempt_at = models.DateTimeField(verbose_name='следующая попытка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='поставлено в очередь')
+    sent_at = models.DateTimeField(**NULLABLE, verbose_name='отправлено')
+    error = models.TextField(blank=True, default='', verbose_name='ошибка')
+
+    class Meta:
+        verbose_name = 'исходящее напоминание'
+        verbose_name_plural = 'исходящие напоминания'
+        indexes = [
+            # выборка обработчиками: только ожидающие записи в порядке готовности
+            models.Index(fields=['next_attempt_at'], condition=models.Q(status='pending'),
+                         name='outbox_pending_idx'),
+            # очистка обработанных записей
+            models.Index(fields=['created_at'], condition=~models.Q(status='pending'), name='outbox_done_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.key}: {self.status}'
@@ -0,0 +1,160 @@
+import base64
+import binascii
+import json
+
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничный вывод по курсору (keyset) с сортировкой по паре (title, id).
+    Курсор хранит название и id крайней привычки страницы, поэтому стоимость страницы не зависит
+    от её номера, а общее количество записей не подсчитывается
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    ordering = ('title', 'id')
+    invalid_cursor_message = 'Неверный курсор'
+
+    def encode_cursor(self, habit, reverse):
+        """Кодирует позицию привычки habit (объекта или строки values()) в строку курсора"""
+        if isinstance(habit, dict):
+            position = {'title': habit['title'], 'id': habit['id'], 'reverse': reverse}
+        else:
+            position = {'title': habit.title, 'id': habit.pk, 'reverse': reverse}
+        cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        """Возвращает позицию из курсора запроса или None для первой страницы"""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return str(position['title']), int(position['id']), bool(position['reverse'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def filter_position(self, queryset, position, operator):
+        """
+        Записи до (operator '<') или после (operator '>') позиции курсора. Сравнение строк (title, id) > (...)
+        БД проверяет как условие составного индекса (title, id) и читает только записи страницы,
+        а OR из двух условий по title и id проверяется фильтром по всем записям до позиции
+        """
+        quote = connection.ops.quote_name
+        table = quote(queryset.model._meta.db_table)
+        condition = RawSQL(f'({table}.{quote("title")}, {table}.{quote("id")}) {operator} (%s, %s)',
+                           position[:2], output_field=BooleanField())
+        return queryset.filter(condition)
+
+    def get_page_queryset(self, queryset, request):
+        """Запрос страницы по курсору запроса с одной лишней записью"""
+        self.base_url = request.build_absolute_uri()
+        position = self.decode_cursor(request)
+        reverse = bool(position and position[2])
+
+        if position is None:
+            queryset = queryset.order_by(*self.ordering)
+        elif reverse:
+            queryset = self.filter_position(queryset, position, '<').order_by('-title', '-id')
+        else:
+            queryset = self.filter_position(queryset, position, '>').order_by(*self.ordering)
+
+        self.position, self.reverse = position, reverse
+        # одна лишняя запись показывает, есть ли страница дальше в направлении чтения
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, page):
+        """Запоминает страницу из записей get_page_queryset и возвращает её"""
+        position, reverse = self.position, self.reverse
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if reverse:
+            page.reverse()
+
+        self.has_next = has_more if not reverse else True
+        self.has_previous = has_more if reverse else position is not None
+        self.page = page
+        return page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Асинхронный вариант paginate_queryset для асинхронных контроллеров"""
+        return self.set_page([row async for row in self.get_page_queryset(queryset, request)])
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class HabitPagination(LimitOffsetPagination):
+    """
+    Постраничный вывод привычек: по умолчанию limit/offset для старых клиентов,
+    при параметре pagination=cursor или переданном курсоре - KeysetPagination
+    """
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (request.query_params.get(self.mode_query_param) == 'cursor'
+                or KeysetPagination.cursor_query_param in request.query_params):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Асинхронный вариант paginate_queryset, число записей и страница читаются через async ORM"""
+        self.keyset = None
+        if (request.query_params.get(self.mode_query_param) == 'cursor'
+                or KeysetPagination.cursor_query_param in request.query_params):
+            self.keyset = KeysetPagination()
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.count = await queryset.acount()
+        self.offset = self.get_offset(request)
+        if self.count == 0 or self.offset > self.count:
+            return []
+        return [row async for row in queryset[self.offset:self.offset + self.limit]]
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
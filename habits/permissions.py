@@ -5,6 +5,7 @@ class IsOwner(BasePermission):
     message = 'Вы не владелец'
 
     def has_object_permission(self, request, view, obj):
-        if request.user == obj.owner:
+        # сравнение по id не загружает владельца из БД
+        if request.user.pk == obj.owner_id:
             return True
         return False
@@ -0,0 +1,92 @@
+import random
+from datetime import time
+
+from django.contrib.auth.hashers import make_password
+
+from habits.models import Habit, HabitSchedule, NiceHabit, period_to_weekdays
+from habits.messages import render_message
+from habits.services import NICE, USEFUL, get_utc_minutes_of_week
+from users.models import User
+
+
+# популярные значения периодичности и их доли
+PERIODS = (('1234567', 30), ('12345', 40), ('67', 10), ('135', 10), ('246', 10))
+
+# часовые пояса пользователей и их доли
+TIMEZONES = (('UTC', 40), ('Europe/Moscow', 40), ('Asia/Yekaterinburg', 10), ('Europe/Berlin', 10))
+
+# утренние и вечерние пики, остальное время распределено равномерно
+PEAK_HOURS = (7, 8, 9, 20, 21, 22)
+
+SEED_EMAIL_DOMAIN = 'seed.local'
+
+
+def random_time(rnd):
+    """Время напоминания: 70% в часы пик, минуты кратны 5"""
+    hour = rnd.choice(PEAK_HOURS) if rnd.random() < 0.7 else rnd.randrange(24)
+    return time(hour, rnd.randrange(0, 60, 5))
+
+
+def weighted(rnd, choices):
+    values, weights = zip(*choices)
+    return rnd.choices(values, weights)[0]
+
+
+def seed_habits(users=100, habits_per_user=10, public_share=0.2, seed=0, batch_size=1000):
+    """
+    Заполняет БД пользователями, полезными и приятными привычками с реалистичным распределением
+    времени и периодичности, строит для них индекс расписания с готовыми текстами напоминаний.
+    Все записи создаются пачками через bulk_create, поэтому сигналы не вызываются и слоты
+    расписания строятся здесь же.
+    Возвращает список созданных пользователей
+    """
+    rnd = random.Random(seed)
+    password = make_password(None)
+    first_id = (User.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+    owners = User.objects.bulk_create(
+        [
+            User(email=f'user{first_id + number}@{SEED_EMAIL_DOMAIN}', password=password,
+                 telegram=first_id + number, timezone=weighted(rnd, TIMEZONES))
+            for number in range(users)
+        ],
+        batch_size=batch_size
+    )
+
+    nice_habits = []
+    for owner in owners:
+        for _ in range(max(1, habits_per_user // 3)):
+            period = weighted(rnd, PERIODS)
+            nice_habits.append(NiceHabit(
+                title=f'Nice {rnd.randrange(1000)}', owner=owner, place='home', time=random_time(rnd),
+                action='rest', period=period, weekdays=period_to_weekdays(period),
+                durations=rnd.randint(1, 120), is_public=rnd.random() < public_share
+            ))
+    nice_habits = NiceHabit.objects.bulk_create(nice_habits, batch_size=batch_size)
+    nice_by_owner = {}
+    for nice_habit in nice_habits:
+        nice_by_owner.setdefault(nice_habit.owner_id, []).append(nice_habit)
+
+    habits = []
+    for owner in owners:
+        for _ in range(habits_per_user):
+            period = weighted(rnd, PERIODS)
+            nice_habit = rnd.choice(nice_by_owner[owner.pk]) if rnd.random() < 0.5 else None
+            habits.append(Habit(
+                title=f'Habit {rnd.randrange(1000)}', owner=owner, place='street', time=random_time(rnd),
+                action='run', period=period, weekdays=period_to_weekdays(period), nice_habit=nice_habit,
+                reward=None if nice_habit else 'banana', durations=rnd.randint(1, 120),
+                is_public=rnd.random() < public_share
+            ))
+    habits = Habit.objects.bulk_create(habits, batch_size=batch_size)
+
+    owners_by_id = {owner.pk: owner for owner in owners}
+    slots = [
+        HabitSchedule(minute_of_week=minute, chat_id=owner.telegram, text=text, **{field: habit})
+        for field, kind, items in (('habit', USEFUL, habits), ('nice_habit', NICE, nice_habits))
+        for habit in items
+        for owner, text in [(owners_by_id[habit.owner_id],
+                             render_message(kind, habit, owners_by_id[habit.owner_id].language))]
+        for minute in get_utc_minutes_of_week(habit.weekdays, habit.time, owner.timezone)
+    ]
+    HabitSchedule.objects.bulk_create(slots, batch_size=batch_size)
+    return owners
@@ -4,7 +4,87 @@ from habits.models import Habit, NiceHabit
 from habits.validators import RewardValidator, PeriodValidator
 
 
-class NiceHabitSerializer(serializers.ModelSerializer):
+class NiceHabitField(serializers.PrimaryKeyRelatedField):
+    """
+    Поле ссылки на приятную привычку. При массовом создании и изменении привычки, на которые
+    ссылаются элементы запроса, загружаются заранее одним запросом и передаются в context['nice_habits']
+    """
+
+    def to_internal_value(self, data):
+        nice_habits = self.context.get('nice_habits')
+        if nice_habits is not None and not isinstance(data, bool):
+            try:
+                return nice_habits[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
+
+# поля, значения которых из values() выводятся без преобразования
+PLAIN_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+
+
+class ValuesSerializerMixin:
+    """
+    Примесь для ModelSerializer, добавляющая быстрый вывод из строк queryset.values() без создания
+    объектов моделей и без вызова to_representation для полей, которые выводятся как есть.
+    Результат совпадает с выводом самого сериализатора. План вывода строится один раз на класс:
+    список (поле, колонка values(), преобразование или вложенный план)
+    """
+
+    @classmethod
+    def get_values_plan(cls):
+        if '_values_plan' not in cls.__dict__:
+            cls._values_plan = cls._build_values_plan(cls())
+        return cls._values_plan
+
+    @staticmethod
+    def _build_values_plan(serializer, prefix=''):
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.BaseSerializer):
+                nested = ValuesSerializerMixin._build_values_plan(field, f'{prefix}{field.source}__')
+                plan.append((name, f'{prefix}{field.source}_id', nested))
+            elif isinstance(field, serializers.RelatedField):
+                plan.append((name, f'{prefix}{field.source}_id', None))
+            else:
+                convert = None if isinstance(field, PLAIN_FIELDS) else field.to_representation
+                plan.append((name, f'{prefix}{field.source}', convert))
+        return plan
+
+    @classmethod
+    def get_values_columns(cls):
+        """Колонки для queryset.values(), нужные для вывода"""
+        def columns(plan):
+            for name, column, convert in plan:
+                if isinstance(convert, list):
+                    yield from columns(convert)
+                else:
+                    yield column
+        return list(columns(cls.get_values_plan()))
+
+    @classmethod
+    def from_values(cls, rows):
+        """Формирует вывод списка из строк values() с колонками get_values_columns"""
+        def represent(plan, row):
+            data = {}
+            for name, column, convert in plan:
+                value = row[column]
+                if value is None or convert is None:
+                    data[name] = value
+                elif isinstance(convert, list):
+                    data[name] = represent(convert, row)
+                else:
+                    data[name] = convert(value)
+            return data
+
+        plan = cls.get_values_plan()
+        return [represent(plan, row) for row in rows]
+
+
+class NiceHabitSerializer(ValuesSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор модели NiceHabit
     """
@@ -14,11 +94,13 @@ class NiceHabitSerializer(serializers.ModelSerializer):
         validators = [PeriodValidator()]
 
 
-class HabitSerializer(serializers.ModelSerializer):
+class HabitSerializer(ValuesSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор модели Habit
     """
     nice_habit_description = NiceHabitSerializer(source='nice_habit', read_only=True)
+    nice_habit = NiceHabitField(queryset=NiceHabit.objects.all(), required=False, allow_null=True,
+                                label='приятная привычка')
 
     class Meta:
         model = Habit
@@ -26,14 +108,14 @@ class HabitSerializer(serializers.ModelSerializer):
         validators = [RewardValidator(), PeriodValidator()]
 
 
-class PublicHabitSerializer(serializers.ModelSerializer):
+class PublicHabitSerializer(ValuesSerializerMixin, serializers.ModelSerializer):
     """Сериализатор публичных полей модели Habit"""
     class Meta:
         model = Habit
         exclude = ('is_public', 'owner', 'id')
 
 
-class PublicNiceHabitSerializer(serializers.ModelSerializer):
+class PublicNiceHabitSerializer(ValuesSerializerMixin, serializers.ModelSerializer):
     """Сериализатор публичных полей модели NiceHabit"""
     class Meta:
         model = NiceHabit
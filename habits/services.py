@@ -1,49 +1,282 @@
-from datetime import datetime
-from time import sleep
-import requests
+from datetime import datetime, timedelta, timezone
+from itertools import groupby, islice
+from operator import itemgetter
+from zoneinfo import ZoneInfo
 
-from conf.settings import TELEGRAM_TOKEN
-from habits.models import Habit, NiceHabit
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+
+from habits.messages import render_message, split_message
+from habits.metrics import observe_delivery, observe_tick
+from habits.models import (Habit, NiceHabit, HabitSchedule, Outbox, ScheduleTimezone, SchedulerState,
+                           weekdays_to_days)
+from users.models import User
+
+
+MINUTES_IN_DAY = 24 * 60
+
+# виды привычек, по ним выбираются шаблоны напоминаний
+USEFUL = 'useful'
+NICE = 'nice'
+
+# имя записи SchedulerState планировщика рассылки
+REMINDERS_SCHEDULER = 'reminders'
+
+
+def get_minute_of_week(week_day, time):
+    """Возвращает номер минуты недели для дня недели week_day (1-7) и времени time"""
+    return (int(week_day) - 1) * MINUTES_IN_DAY + time.hour * 60 + time.minute
+
+
+def get_utc_minutes_of_week(weekdays, time, timezone_name, now=None):
+    """
+    Переводит местное время time в дни недели из маски weekdays в номера минут недели по UTC.
+    Смещение часового пояса берётся на ближайшее будущее напоминание с этим днём недели после now:
+    если сегодня время уже прошло - через неделю. Поэтому слоты, перестроенные после перехода на летнее
+    время, получают новое смещение, см. refresh_schedule
+    """
+    zone = ZoneInfo(timezone_name)
+    now = (now or datetime.now(timezone.utc)).astimezone(zone)
+    for week_day in weekdays_to_days(weekdays):
+        day = now.date() + timedelta(days=(week_day - now.isoweekday()) % 7)
+        moment = datetime.combine(day, time, tzinfo=zone)
+        if moment <= now:
+            moment = datetime.combine(day + timedelta(days=7), time, tzinfo=zone)
+        moment = moment.astimezone(timezone.utc)
+        yield get_minute_of_week(moment.isoweekday(), moment)
+
+
+def build_schedules(habits):
+    """
+    Перестраивает слоты расписания для списка полезных (Habit) или приятных (NiceHabit) привычек
+    одного вида двумя запросами. Слоты хранятся в минутах недели по UTC с учётом часового пояса
+    владельца вместе с его telegram id и готовым текстом напоминания на его языке, поэтому владелец
+    должен быть уже загружен. Для привычек без времени слоты не создаются
+    """
+    habits = list(habits)
+    if not habits:
+        return
+    field, kind = ('habit', USEFUL) if isinstance(habits[0], Habit) else ('nice_habit', NICE)
+    HabitSchedule.objects.filter(**{f'{field}__in': habits}).delete()
+    time_field = habits[0]._meta.get_field('time')
+    slots = []
+    for habit in habits:
+        if habit.time is None:
+            continue
+        # время может быть ещё строкой, если привычка создана через objects.create
+        time = time_field.to_python(habit.time)
+        owner = habit.owner if habit.owner_id else None
+        timezone_name = owner.timezone if owner else settings.TIME_ZONE
+        chat_id = owner.telegram if owner else None
+        text = render_message(kind, habit, owner.language if owner else None)
+        slots += [
+            HabitSchedule(minute_of_week=minute, chat_id=chat_id, text=text, **{field: habit})
+            for minute in get_utc_minutes_of_week(habit.weekdays, time, timezone_name)
+        ]
+    HabitSchedule.objects.bulk_create(slots)
+
+
+def build_schedule(habit):
+    """Перестраивает слоты расписания одной полезной или приятной привычки"""
+    build_schedules([habit])
+
+
+def build_owner_schedule(owner):
+    """Перестраивает слоты расписания всех привычек пользователя owner"""
+    for model in (Habit, NiceHabit):
+        build_schedules(model.objects.filter(owner=owner).select_related('owner'))
+
+
+def refresh_schedule(now=None):
+    """
+    Перестраивает слоты расписания пользователей, у часового пояса которых смещение от UTC изменилось
+    с прошлого перестроения (переход на летнее или зимнее время). Смещение, с которым построены слоты
+    пояса, хранится в ScheduleTimezone, поэтому каждый переход перестраивает расписание пояса один раз.
+    Пояс без записи перестраивается при первом запуске
+    """
+    now = now or datetime.now(timezone.utc)
+    timezone_names = User.objects.filter(
+        Q(habit__isnull=False) | Q(nicehabit__isnull=False)
+    ).values_list('timezone', flat=True).distinct()
+    applied = dict(ScheduleTimezone.objects.values_list('timezone', 'utc_offset'))
+    for timezone_name in timezone_names:
+        utc_offset = int(now.astimezone(ZoneInfo(timezone_name)).utcoffset().total_seconds()) // 60
+        if applied.get(timezone_name) == utc_offset:
+            continue
+        for owner in User.objects.filter(timezone=timezone_name):
+            build_owner_schedule(owner)
+        ScheduleTimezone.objects.update_or_create(timezone=timezone_name, defaults={'utc_offset': utc_offset})
+
+
+def send_telegram_messages(messages):
+    """
+    Отправляет пары (telegram_id, message) через асинхронную рассылку с ограничением скорости
+    напрямую или через шлюз telegram_gateway (TELEGRAM_TRANSPORT), возвращает список результатов отправки.
+    Напрямую ограничения скорости общие для всех задач процесса, но не для разных процессов
+    """
+    # клиенты Redis и httpx импортируются только в процессах, которые отправляют сообщения
+    if settings.TELEGRAM_TRANSPORT == 'gateway':
+        from habits.gateway import get_gateway_client
+        # метрики отправки учитывают шлюз и, если шлюз не ответил, клиент
+        return get_gateway_client().deliver(messages)
+    from habits.telegram import get_delivery
+    results = get_delivery().deliver(messages)
+    observe_delivery(results)
+    return results
 
 
 def send_telegram_message(telegram_id, message):
     """Отправляет сообщение message пользователю телеграмм с id telegram_id"""
-    params = {
-        'chat_id': telegram_id,
-        'text': message
-    }
-    url = f'https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage'
-    requests.get(url, params)
+    return send_telegram_messages([(telegram_id, message)])[0]
 
-def run_habits():
+
+def get_due_slots(start, end):
     """
-    Просматривает все полезные и приятные привычки, выбирает соответствующие текущей дате
-    и времени и рассылает их владельцам
+    Возвращает queryset строк (минута недели, telegram id, текст) слотов расписания с рассылкой
+    в минуты с start по end включительно (меньше недели), одним запросом по диапазону минут недели.
+    Строки упорядочены по минуте и получателю, полезные привычки идут перед приятными.
+    Приятные привычки рассылаются, только если привязаны к полезным привычкам.
+    Слоты владельцев без telegram id отбрасываются в запросе
     """
-    current_time = datetime.now().time().replace(second=0, microsecond=0)
-    current_week_day = str(datetime.now().isoweekday())
+    first = get_minute_of_week(start.isoweekday(), start)
+    last = get_minute_of_week(end.isoweekday(), end)
+    if first <= last:
+        slots = HabitSchedule.objects.filter(minute_of_week__range=(first, last))
+    else:
+        # диапазон переходит через конец недели
+        slots = HabitSchedule.objects.filter(Q(minute_of_week__gte=first) | Q(minute_of_week__lte=last))
+    return slots.filter(
+        Q(habit__isnull=False) | Q(Exists(Habit.objects.filter(nice_habit=OuterRef('nice_habit')))),
+        chat_id__isnull=False
+    ).values_list('minute_of_week', 'chat_id', 'text').order_by(
+        'minute_of_week', 'chat_id', F('nice_habit').asc(nulls_first=True), 'id'
+    )
 
-    # выбираем полезные привычки с рассылкой сегодня в текущее время
-    useful_habits = Habit.objects.filter(time=current_time, period__contains=current_week_day)
 
-    # выбираем приятные привычки, привязанные к полезным привычкам с рассылкой сегодня в текущее время
-    nice_habits = NiceHabit.objects.filter(
-        id__in=Habit.objects.filter(nice_habit__isnull=False).values_list('nice_habit_id', flat=True),
-        time=current_time,
-        period__contains=current_week_day
-    )
+def chunked(iterable, size):
+    """Разбивает итерируемый объект на списки по size элементов, не загружая его целиком"""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def get_due_messages(start, end, batch_size=None):
+    """
+    Объединяет напоминания с рассылкой в минуты с start по end в сообщения (ключ, telegram id, текст):
+    все напоминания одного получателя за одну минуту отправляются одним сообщением, длинные делятся
+    по ограничению Telegram, см. split_message. Ключ (получатель, минута, номер части) не даёт поставить
+    сообщение в очередь повторно. Строки читаются через серверный курсор порциями по batch_size,
+    поэтому память не зависит от числа привычек в минуте
+    """
+    batch_size = batch_size or settings.REMINDER_BATCH_SIZE
+    minutes = {}
+    moment = start
+    while moment <= end:
+        minutes[get_minute_of_week(moment.isoweekday(), moment)] = moment.isoformat()
+        moment += timedelta(minutes=1)
+
+    rows = get_due_slots(start, end).iterator(chunk_size=batch_size)
+    for (minute_of_week, chat_id), group in groupby(rows, key=itemgetter(0, 1)):
+        for part, text in enumerate(split_message(text for _, _, text in group)):
+            yield f'reminder:{chat_id}:{minutes[minute_of_week]}:{part}', chat_id, text
+
+
+def utcnow():
+    """Текущее время по UTC без часового пояса, как хранятся даты в БД (USE_TZ = False)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def run_habits(now=None):
+    """
+    Записывает в очередь Outbox напоминания о привычках за все минуты после последней обработанной
+    (SchedulerState) до текущей минуты по UTC (или минуты now) включительно, по одному сообщению
+    на получателя в минуту, и после фиксации транзакции запускает задачи send_outbox. Опоздавшие
+    и пропущенные тики догоняются одним запросом по диапазону минут, но не дальше
+    REMINDER_MAX_CATCHUP_MINUTES назад. Уникальный ключ сообщения не даёт поставить его в очередь
+    повторно. Возвращает текущую минуту, число обработанных минут, число сообщений в очереди
+    и отставание тика в секундах от самой ранней обработанной минуты (None, если сообщений не было)
+    """
+    from habits.tasks import send_outbox
+
+    started_at = utcnow()
+    now = (now or started_at).replace(second=0, microsecond=0, tzinfo=None)
+    messages = minutes = 0
+    with transaction.atomic():
+        # блокировка записи состояния не даёт пересекающимся тикам обработать одни и те же минуты
+        state, _ = SchedulerState.objects.select_for_update().get_or_create(name=REMINDERS_SCHEDULER)
+        start = now if state.last_minute is None else state.last_minute + timedelta(minutes=1)
+        start = max(start, now - timedelta(minutes=settings.REMINDER_MAX_CATCHUP_MINUTES))
+        if start <= now:
+            minutes = int((now - start).total_seconds()) // 60 + 1
+            for batch in chunked(get_due_messages(start, now), settings.REMINDER_BATCH_SIZE):
+                Outbox.objects.bulk_create(
+                    [Outbox(key=key, chat_id=chat_id, text=text, next_attempt_at=started_at)
+                     for key, chat_id, text in batch],
+                    ignore_conflicts=True
+                )
+                messages += len(batch)
+            state.last_minute = now
+            state.save(update_fields=['last_minute'])
+        # задачи запускаются и без новых записей, чтобы разобрать повторные попытки
+        workers = min(max(-(-messages // settings.REMINDER_BATCH_SIZE), 1), settings.REMINDER_OUTBOX_WORKERS)
+        transaction.on_commit(lambda: [send_outbox.delay() for _ in range(workers)])
+
+    # отставание считается от самой ранней минуты тика: её напоминания уходят позже всех
+    lag = (started_at - start).total_seconds() if messages else None
+    observe_tick(messages, (utcnow() - started_at).total_seconds(), lag)
+    return {'scheduled_at': now.isoformat(), 'minutes': minutes, 'messages': messages, 'lag': lag}
+
+
+def get_retry_delay(attempts, retry_after=None):
+    """
+    Пауза перед попыткой отправки номер attempts + 1: растёт экспоненциально от REMINDER_RETRY_BASE
+    до REMINDER_RETRY_MAX секунд, но не меньше retry_after, которое вернул Telegram
+    """
+    delay = min(settings.REMINDER_RETRY_BASE * 2 ** (attempts - 1), settings.REMINDER_RETRY_MAX)
+    return timedelta(seconds=max(delay, retry_after or 0))
+
+
+def drain_outbox(batch_size=None):
+    """
+    Отправляет одну пачку готовых к отправке напоминаний из Outbox. Записи блокируются
+    SELECT ... FOR UPDATE SKIP LOCKED до конца транзакции, поэтому несколько обработчиков разбирают
+    очередь параллельно без пересечений, а при падении обработчика записи снова становятся доступны.
+    Неудачные отправки откладываются по get_retry_delay, после REMINDER_MAX_ATTEMPTS попыток запись
+    помечается как неотправленная. Возвращает число отправленных, отложенных и неотправленных сообщений
+    """
+    batch_size = batch_size or settings.REMINDER_BATCH_SIZE
+    with transaction.atomic():
+        messages = list(
+            Outbox.objects.select_for_update(skip_locked=True)
+            .filter(status=Outbox.PENDING, next_attempt_at__lte=utcnow())
+            .order_by('next_attempt_at')
+            .values_list('id', 'chat_id', 'text', 'attempts')[:batch_size]
+        )
+        if not messages:
+            return {'sent': 0, 'retried': 0, 'failed': 0}
+        results = send_telegram_messages([(chat_id, text) for _, chat_id, text, _ in messages])
+
+        now = utcnow()
+        sent_ids, retried = [], []
+        for (message_id, _, _, attempts), result in zip(messages, results):
+            if result.ok:
+                sent_ids.append(message_id)
+                continue
+            attempts += 1
+            retried.append(Outbox(
+                id=message_id, attempts=attempts, error=result.error or '',
+                status=Outbox.FAILED if attempts >= settings.REMINDER_MAX_ATTEMPTS else Outbox.PENDING,
+                next_attempt_at=now + get_retry_delay(attempts, result.retry_after)
+            ))
+        Outbox.objects.filter(id__in=sent_ids).update(status=Outbox.SENT, sent_at=now)
+        Outbox.objects.bulk_update(retried, ['attempts', 'error', 'status', 'next_attempt_at'])
+    failed = sum(message.status == Outbox.FAILED for message in retried)
+    return {'sent': len(sent_ids), 'retried': len(retried) - failed, 'failed': failed}
+
 
-    if useful_habits:
-        for habit in useful_habits:
-            reward = ''
-            if habit.reward:
-                reward = f'Ваша награда: {habit.reward}'
-            message = f'Выполните:{habit.action} {habit.place}, у вас есть {habit.durations} секунд.{reward}'
-            send_telegram_message(habit.owner.telegram, message)
-            sleep(2)  # задержка, чтобы телеграмм не забанил за рассылку спама
-
-    if nice_habits:
-        for habit in nice_habits:
-            message = f'Насладитесь:{habit.action} {habit.place}, у вас есть {habit.durations} секунд.'
-            send_telegram_message(habit.owner.telegram, message)
-            sleep(2)  # задержка, чтобы телеграмм не забанил за рассылку спама
+def compact_outbox():
+    """Удаляет из Outbox отправленные и неотправленные записи старше REMINDER_OUTBOX_RETENTION секунд"""
+    cutoff = utcnow() - timedelta(seconds=settings.REMINDER_OUTBOX_RETENTION)
+    deleted, _ = Outbox.objects.exclude(status=Outbox.PENDING).filter(created_at__lt=cutoff).delete()
+    return deleted
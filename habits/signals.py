@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from habits.caching import (PUBLIC_HABITS, PUBLIC_SCOPES, bump_cache_version, get_owner_scopes,
+                            invalidate_owner_cache)
+from habits.models import Habit, NiceHabit
+from habits.services import build_owner_schedule, build_schedule
+
+
+@receiver(post_save, sender=Habit)
+@receiver(post_save, sender=NiceHabit)
+def update_schedule(sender, instance, **kwargs):
+    """Перестраивает слоты расписания привычки после её создания или изменения.
+    При удалении привычки слоты удаляются каскадно"""
+    build_schedule(instance)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def update_owner_schedule(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Перестраивает слоты расписания привычек пользователя, если могли измениться его часовой пояс,
+    telegram id или язык, которые хранятся в слотах
+    """
+    if created or (update_fields is not None and not {'timezone', 'telegram', 'language'} & set(update_fields)):
+        return
+    build_owner_schedule(instance)
+
+
+@receiver(pre_save, sender=Habit)
+@receiver(pre_save, sender=NiceHabit)
+def remember_public(sender, instance, **kwargs):
+    """Запоминает, была ли изменяемая привычка публичной до сохранения"""
+    instance._was_public = (
+        not instance._state.adding and sender.objects.filter(pk=instance.pk, is_public=True).exists()
+    )
+
+
+@receiver(post_save, sender=Habit)
+@receiver(post_save, sender=NiceHabit)
+def invalidate_public_cache_on_save(sender, instance, **kwargs):
+    """Сбрасывает кэш публичного списка, если привычка была или стала публичной"""
+    if instance.is_public or getattr(instance, '_was_public', False):
+        bump_cache_version(PUBLIC_SCOPES[sender])
+
+
+@receiver(post_delete, sender=Habit)
+@receiver(post_delete, sender=NiceHabit)
+def invalidate_public_cache_on_delete(sender, instance, **kwargs):
+    """Сбрасывает кэш публичного списка при удалении публичной привычки после фиксации транзакции,
+    чтобы запрос между сбросом и фиксацией не закэшировал список ещё с удаляемой привычкой.
+    Удаление приятной привычки обнуляет ссылки на неё у полезных привычек, поэтому сбрасывается и их кэш"""
+    scopes = set()
+    if instance.is_public:
+        scopes.add(PUBLIC_SCOPES[sender])
+    if sender is NiceHabit:
+        scopes.add(PUBLIC_HABITS)
+    if scopes:
+        transaction.on_commit(lambda: [bump_cache_version(scope) for scope in scopes])
+
+
+@receiver(post_save, sender=Habit)
+@receiver(post_save, sender=NiceHabit)
+def invalidate_owner_cache_on_save(sender, instance, **kwargs):
+    """Сбрасывает кэш привычек владельца после создания или изменения привычки"""
+    invalidate_owner_cache(sender, [instance])
+
+
+@receiver(pre_delete, sender=Habit)
+@receiver(pre_delete, sender=NiceHabit)
+def invalidate_owner_cache_on_delete(sender, instance, **kwargs):
+    """Сбрасывает кэш привычек владельца при удалении привычки после фиксации транзакции. Области кэша
+    собираются до удаления, пока ссылки полезных привычек на удаляемую приятную привычку ещё не обнулены"""
+    scopes = get_owner_scopes(sender, [instance])
+    transaction.on_commit(lambda: [bump_cache_version(scope) for scope in scopes])
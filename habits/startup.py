@@ -0,0 +1,32 @@
+from django.urls import get_resolver
+from rest_framework.settings import api_settings
+
+from habits.serializers import ValuesSerializerMixin
+
+
+def populate_resolver(resolver):
+    """Заполняет словари обратного разрешения адресов распознавателя и всех вложенных пространств имён"""
+    resolver.reverse_dict
+    for _, namespace_resolver in resolver.namespace_dict.values():
+        populate_resolver(namespace_resolver)
+
+
+def get_values_serializers(cls=ValuesSerializerMixin):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from get_values_serializers(subclass)
+
+
+def warm_up():
+    """
+    Выполняет при загрузке приложения работу, которую иначе делает первый запрос каждого процесса:
+    разбор шаблонов адресов, импорт классов из настроек DRF и построение планов вывода сериализаторов
+    (см. ValuesSerializerMixin). При gunicorn --preload вызывается один раз в главном процессе,
+    и рабочие процессы получают готовые структуры при fork
+    """
+    populate_resolver(get_resolver())
+    for name in ('DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES', 'DEFAULT_AUTHENTICATION_CLASSES',
+                 'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_PAGINATION_CLASS', 'EXCEPTION_HANDLER'):
+        getattr(api_settings, name)
+    for serializer_class in get_values_serializers():
+        serializer_class.get_values_plan()
@@ -1,12 +1,50 @@
 from celery import shared_task
+from django.db import connection
 
-from habits.services import run_habits
+from habits.services import compact_outbox, drain_outbox, refresh_schedule, run_habits
 
 
-@shared_task
-def check_habits_and_send():
+def send_metrics_event(task, type_, **fields):
+    """Отправляет событие с метриками задачи мониторингу Celery (Flower, экспортёры), если события включены"""
+    if task.app.conf.worker_send_task_events and not task.request.called_directly:
+        task.send_event(type_, **fields)
+
+
+@shared_task(bind=True)
+def check_habits_and_send(self):
     """
-    Таск, проверяющий время и день отправки привычки и отправляющий сообщение в телеграмм.
+    Таск, проверяющий время и день отправки привычки и ставящий в очередь задачи рассылки в телеграмм.
     Необходимо добавить этот таск в Periodic Tasks на исполнение каждую минуту
     """
-    run_habits()
+    # было ли к началу задачи открыто постоянное соединение с БД
+    db_connection_reused = connection.connection is not None
+    send_metrics_event(self, 'task-reminder-tick', db_connection_reused=db_connection_reused, **run_habits())
+
+
+@shared_task(bind=True)
+def send_outbox(self):
+    """
+    Таск, разбирающий пачками очередь исходящих напоминаний Outbox, пока в ней есть готовые к отправке.
+    Запускается планировщиком после каждого тика, направляется в отдельную очередь reminders,
+    см. CELERY_TASK_ROUTES. Несколько таких тасков работают параллельно
+    """
+    while any((result := drain_outbox()).values()):
+        send_metrics_event(self, 'task-reminder-batch', **result)
+
+
+@shared_task
+def compact_reminder_outbox():
+    """
+    Таск, удаляющий из очереди Outbox обработанные напоминания старше REMINDER_OUTBOX_RETENTION.
+    Необходимо добавить этот таск в Periodic Tasks на исполнение каждый час
+    """
+    compact_outbox()
+
+
+@shared_task
+def refresh_habit_schedule():
+    """
+    Таск, перестраивающий расписание пользователей, у которых прошёл переход на летнее или зимнее время.
+    Необходимо добавить этот таск в Periodic Tasks на исполнение каждый час
+    """
+    refresh_schedule()
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+import httpx
+from django.conf import settings
+
+
+DeliveryResult = namedtuple('DeliveryResult', ('chat_id', 'ok', 'retry_after', 'error', 'latency'))
+
+
+class TokenBucket:
+    """
+    Ограничитель скорости по алгоритму "ведро с токенами":
+    пополняется со скоростью rate токенов в секунду, вмещает не больше capacity токенов
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def is_full(self, now):
+        """Ведро успело заполниться к моменту now и ничем не отличается от нового"""
+        return self.tokens + (now - self.updated_at) * self.rate >= self.capacity
+
+    async def acquire(self):
+        """Ждёт, пока в ведре появится токен, и забирает его"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class DeliveryStats:
+    """Счётчики пропускной способности и задержек отправки"""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.started_at = time.monotonic()
+
+    def add(self, result):
+        if result.ok:
+            self.sent += 1
+        else:
+            self.failed += 1
+        self.latency_total += result.latency
+        self.latency_max = max(self.latency_max, result.latency)
+
+    @property
+    def latency_avg(self):
+        total = self.sent + self.failed
+        return self.latency_total / total if total else 0.0
+
+    @property
+    def throughput(self):
+        """Отправлено сообщений в секунду с момента создания счётчиков"""
+        elapsed = time.monotonic() - self.started_at
+        return self.sent / elapsed if elapsed else 0.0
+
+
+class TelegramDelivery:
+    """
+    Асинхронная рассылка сообщений через Telegram Bot API.
+    Использует один пул keep-alive соединений на пачку сообщений, ограничивает число одновременных
+    запросов (concurrency), общую скорость отправки (global_rate, сообщений в секунду) и скорость
+    отправки в один чат (chat_rate, сообщений в секунду).
+    Вёдра чатов, успевшие заполниться, удаляются не чаще раза в 1 / chat_rate секунд, поэтому
+    в долго работающем процессе (шлюз) их число ограничено чатами, писавшими за последние 1 / chat_rate секунд
+    """
+
+    def __init__(self, token=None, api_url=None, concurrency=None, global_rate=None, chat_rate=None, timeout=10):
+        self.token = token or settings.TELEGRAM_TOKEN
+        self.api_url = api_url or settings.TELEGRAM_API_URL
+        self.concurrency = concurrency or settings.TELEGRAM_CONCURRENCY
+        self.global_rate = global_rate or settings.TELEGRAM_GLOBAL_RATE
+        self.chat_rate = chat_rate or settings.TELEGRAM_CHAT_RATE
+        self.timeout = timeout
+        self.stats = DeliveryStats()
+        self.global_bucket = TokenBucket(self.global_rate)
+        self.chat_buckets = {}
+        self.chat_buckets_swept_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            self._drop_full_chat_buckets()
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, capacity=1)
+        return bucket
+
+    def _drop_full_chat_buckets(self):
+        """Удаляет вёдра чатов, которые заполнились: для чата без ведра создаётся такое же полное"""
+        now = time.monotonic()
+        if now - self.chat_buckets_swept_at < 1 / self.chat_rate:
+            return
+        self.chat_buckets_swept_at = now
+        self.chat_buckets = {
+            chat_id: bucket for chat_id, bucket in self.chat_buckets.items() if not bucket.is_full(now)
+        }
+
+    async def _send(self, client, semaphore, chat_id, text):
+        await self._chat_bucket(chat_id).acquire()
+        await self.global_bucket.acquire()
+        async with semaphore:
+            started_at = time.monotonic()
+            try:
+                response = await client.post('sendMessage', json={'chat_id': chat_id, 'text': text})
+                data = response.json()
+            except (httpx.HTTPError, ValueError) as error:
+                result = DeliveryResult(chat_id, False, None, str(error), time.monotonic() - started_at)
+            else:
+                result = DeliveryResult(
+                    chat_id,
+                    bool(data.get('ok')),
+                    data.get('parameters', {}).get('retry_after'),
+                    data.get('description'),
+                    time.monotonic() - started_at
+                )
+        self.stats.add(result)
+        return result
+
+    def client(self):
+        """Пул keep-alive соединений к Bot API на concurrency соединений"""
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        return httpx.AsyncClient(base_url=f'{self.api_url}/bot{self.token}/', limits=limits, timeout=self.timeout)
+
+    async def send_batch(self, client, semaphore, messages):
+        """Отправляет пары (chat_id, text) через открытый пул client, возвращает список DeliveryResult"""
+        return await asyncio.gather(
+            *(self._send(client, semaphore, chat_id, text) for chat_id, text in messages)
+        )
+
+    async def send_many(self, messages):
+        """Отправляет пары (chat_id, text), возвращает список DeliveryResult в том же порядке"""
+        async with self.client() as client:
+            return await self.send_batch(client, asyncio.Semaphore(self.concurrency), messages)
+
+    def deliver(self, messages):
+        """
+        Синхронная обёртка над send_many для вызова из задач Celery. Вызовы из разных потоков
+        и зелёных нитей выполняются по очереди: в пуле eventlet все нити работают в одном потоке ОС,
+        а в нём может работать только один цикл событий asyncio
+        """
+        messages = list(messages)
+        if not messages:
+            return []
+        with self.lock:
+            return asyncio.run(self.send_many(messages))
+
+
+@lru_cache(maxsize=None)
+def get_delivery():
+    """Рассылка с одними ограничениями скорости на процесс для всех задач, отправляющих напрямую"""
+    return TelegramDelivery()
@@ -1,8 +1,43 @@
-from django.urls import reverse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time as time_module
+from datetime import date, datetime, time, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.urls import get_resolver, reverse
+from prometheus_client import REGISTRY
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from conf.celery import configure_db_connections
+from users.authentication import CachedBasicAuthentication, CachedJWTAuthentication
+from users.caching import get_user_cache_key
 from users.models import User
-from habits.models import Habit, NiceHabit
+from habits.benchmarks import parse_importtime
+from habits.gateway import GatewayClient, TelegramGateway
+from habits.paginators import KeysetPagination
+from habits.messages import MESSAGE_LIMIT, split_message
+from habits.models import (Habit, HabitSchedule, NiceHabit, Outbox, ScheduleTimezone, SchedulerState,
+                           weekdays_to_days)
+from habits.services import (REMINDERS_SCHEDULER, compact_outbox, drain_outbox, get_due_messages, get_retry_delay,
+                             get_utc_minutes_of_week, refresh_schedule, run_habits, utcnow)
+from habits.renderers import ORJSONRenderer
+from habits.serializers import HabitSerializer, NiceHabitSerializer, PublicHabitSerializer
+from habits.startup import warm_up
+from habits.telegram import DeliveryResult, TelegramDelivery, get_delivery
 
 
 class UserTestCase(APITestCase):
@@ -68,6 +103,50 @@ class UserTestCase(APITestCase):
         )
 
 
+class AuthenticationTestCase(APITestCase):
+    """Тест аутентификации с кэшем пользователя"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='test@test.ru')
+        self.user.set_password('12345')
+        self.user.save()
+        self.token = str(AccessToken.for_user(self.user))
+
+    def test_jwt_cached_user(self):
+        """Тест, что пользователь JWT берётся из кэша, а изменение пользователя сбрасывает кэш"""
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(self.client.get(reverse('habits:useful-list')).status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(cache.get(get_user_cache_key(self.user.pk)))
+        with self.assertNumQueries(0):
+            CachedJWTAuthentication().authenticate(APIRequestFactory().get(
+                '/', HTTP_AUTHORIZATION=f'Bearer {self.token}'
+            ))
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(cache.get(get_user_cache_key(self.user.pk)))
+        with self.assertRaises(AuthenticationFailed):
+            CachedJWTAuthentication().authenticate(APIRequestFactory().get(
+                '/', HTTP_AUTHORIZATION=f'Bearer {self.token}'
+            ))
+
+    def test_basic_cached_credentials(self):
+        """Тест, что пароль BasicAuth проверяется один раз, а после смены пароля старый не подходит"""
+        authentication = CachedBasicAuthentication()
+        user, _ = authentication.authenticate_credentials('test@test.ru', '12345')
+        self.assertEqual(user, self.user)
+        with patch('rest_framework.authentication.authenticate') as authenticate:
+            self.assertEqual(authentication.authenticate_credentials('test@test.ru', '12345')[0], self.user)
+        authenticate.assert_not_called()
+
+        self.user.set_password('54321')
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate_credentials('test@test.ru', '12345')
+        self.assertEqual(authentication.authenticate_credentials('test@test.ru', '54321')[0], self.user)
+
+
 class HabitTestCase(APITestCase):
     """Тест для контроллера HabitViewSet"""
 
@@ -217,6 +296,161 @@ class HabitTestCase(APITestCase):
             status.HTTP_200_OK
         )
 
+    def test_habit_list_cursor(self):
+        """Тест постраничного вывода по курсору вперёд и назад при одинаковых названиях"""
+        titles = ['b', 'a', 'c', 'a', 'b', 'a', 'd']
+        for title in titles:
+            Habit.objects.create(**{**self.habit_data, 'title': title})
+        expected = list(Habit.objects.order_by('title', 'id').values_list('id', flat=True))
+
+        response = self.client.get(reverse('habits:useful-list'), {'pagination': 'cursor'}).json()
+        self.assertNotIn('count', response)
+        first_page = [habit['id'] for habit in response['results']]
+        self.assertIsNone(response['previous'])
+        response = self.client.get(response['next']).json()
+        second_page = [habit['id'] for habit in response['results']]
+        self.assertEqual(first_page + second_page, expected)
+        self.assertIsNone(response['next'])
+
+        response = self.client.get(response['previous']).json()
+        self.assertEqual([habit['id'] for habit in response['results']], first_page)
+
+    def test_habit_list_cursor_plan(self):
+        """Тест, что позиция курсора проверяется условием индекса, а не фильтром по прочитанным записям"""
+        owner = self.habit_data['owner']
+        for title in ['a', 'b', 'c']:
+            Habit.objects.create(**{**self.habit_data, 'title': title})
+        habit = Habit.objects.get(title='b')
+        paginator = KeysetPagination()
+        for reverse_page in (False, True):
+            paginator.base_url = 'http://testserver/'
+            url = paginator.encode_cursor(habit, reverse_page)
+            request = Request(APIRequestFactory().get(url))
+            queryset = paginator.get_page_queryset(Habit.objects.filter(owner=owner), request)
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                plan = queryset.explain()
+            index_cond = [line for line in plan.splitlines() if 'Index Cond' in line]
+            self.assertEqual(len(index_cond), 1, plan)
+            self.assertIn('ROW(', index_cond[0])
+            self.assertNotIn('Filter', plan)
+
+    def test_habit_bulk_create(self):
+        """Тест массового создания привычек: число запросов не зависит от числа привычек"""
+        nice_habit = NiceHabit.objects.create(title='Nice', action='rest', owner=self.habit_data['owner'])
+        data = [
+            {'title': f'Habit {number}', 'time': '10:00:00', 'action': 'run!', 'period': '12', 'durations': 60,
+             'nice_habit': nice_habit.pk}
+            for number in range(20)
+        ]
+        with self.assertNumQueries(7):
+            response = self.client.post(reverse('habits:useful-bulk'), data=data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        habits = Habit.objects.filter(owner=self.habit_data['owner'])
+        self.assertEqual(habits.count(), 20)
+        self.assertEqual(HabitSchedule.objects.filter(habit__in=habits).count(), 40)
+
+    def test_habit_bulk_create_errors(self):
+        """Тест, что при ошибке в одном элементе возвращаются ошибки по элементам и ничего не создаётся"""
+        data = [
+            {'title': 'Good', 'action': 'run!', 'period': '1'},
+            {'title': 'Bad', 'action': 'run!', 'period': '9qw'},
+        ]
+        response = self.client.post(reverse('habits:useful-bulk'), data=data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()[0], {})
+        self.assertIn('non_field_errors', response.json()[1])
+        self.assertFalse(Habit.objects.exists())
+
+    def test_habit_bulk_update_and_delete(self):
+        """Тест массового изменения и удаления привычек"""
+        habits = [Habit.objects.create(**self.habit_data) for _ in range(3)]
+        data = [{'id': habit.pk, 'time': '11:00:00', 'period': '7'} for habit in habits]
+        response = self.client.patch(reverse('habits:useful-bulk'), data=data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(HabitSchedule.objects.filter(habit__in=habits).values_list('minute_of_week', flat=True)),
+            {6 * 1440 + 660}
+        )
+        self.assertEqual(Habit.objects.get(pk=habits[0].pk).weekdays, 0b1000000)
+
+        response = self.client.delete(reverse('habits:useful-bulk'), data=[habit.pk for habit in habits],
+                                      format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Habit.objects.exists())
+
+    def test_habit_list_cache(self):
+        """Тест кэша списка и просмотра своих привычек и его сброса при изменении привычек владельца"""
+        cache.clear()
+        owner = self.habit_data['owner']
+        nice_habit = NiceHabit.objects.create(title='Nice', action='rest', owner=owner)
+        habits = [Habit.objects.create(**{**self.habit_data, 'reward': None, 'nice_habit': nice_habit})
+                  for _ in range(3)]
+
+        # при промахе: пользователь, число записей и привычки вместе с приятными одним запросом
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('habits:useful-list'))
+        etag = response['ETag']
+        # при попадании пользователь тоже берётся из кэша аутентификации
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('habits:useful-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        detail_url = reverse('habits:useful-detail', args=[habits[0].pk])
+        self.client.get(detail_url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(detail_url).json()['id'], habits[0].pk)
+
+        # изменение приятной привычки сбрасывает кэш полезных привычек, которые её выводят
+        self.client.patch(reverse('habits:nice-detail', args=[nice_habit.pk]), {'title': 'Nicer'})
+        response = self.client.get(reverse('habits:useful-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'][0]['nice_habit_description']['title'], 'Nicer')
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.delete(detail_url)
+            # до фиксации удаления кэш не сбрасывается, чтобы его не заполнили ещё не удалёнными записями
+            self.assertEqual(self.client.get(reverse('habits:useful-list')).json()['count'], 3)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(detail_url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('habits:useful-list')).json()['count'], 2)
+
+    def test_values_serializers(self):
+        """Тест, что вывод из строк values() совпадает с выводом сериализаторов и рендерится orjson"""
+        owner = self.habit_data['owner']
+        nice_habit = NiceHabit.objects.create(title='Nice', action='rest', time='09:00:00', owner=owner)
+        Habit.objects.create(**{**self.habit_data, 'reward': None, 'nice_habit': nice_habit})
+        Habit.objects.create(**{**self.habit_data, 'time': None})
+        for serializer_class, queryset in ((HabitSerializer, Habit.objects.all()),
+                                           (PublicHabitSerializer, Habit.objects.all()),
+                                           (NiceHabitSerializer, NiceHabit.objects.all())):
+            expected = serializer_class(queryset, many=True).data
+            values = serializer_class.from_values(queryset.values(*serializer_class.get_values_columns()))
+            self.assertEqual(values, expected)
+            self.assertEqual(ORJSONRenderer().render(values), JSONRenderer().render(expected))
+
+    def test_metrics(self):
+        """Тест учёта числа запросов к БД для запроса к API и вывода метрик в формате Prometheus"""
+        self.client.get(reverse('habits:useful-list'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('http_request_queries_count{method="GET",view="habits:useful-list"}', response.content.decode())
+        self.assertIn('db_connections_total{reused="true"}', response.content.decode())
+
+    @override_settings(METRICS_TOKEN='secret', METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_metrics_access(self):
+        """Тест доступа к метрикам: с разрешённого адреса или с токеном METRICS_TOKEN"""
+        self.client.credentials()  # без токена пользователя из setUp
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.1').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.1', HTTP_AUTHORIZATION='Bearer wrong').status_code,
+                         status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.1', HTTP_AUTHORIZATION='Bearer secret').status_code,
+                         status.HTTP_200_OK)
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.1', HTTP_AUTHORIZATION='Bearer ').status_code,
+                             status.HTTP_403_FORBIDDEN)
+
     def test_habit_update(self):
         """Тест обновления объекта модели Habit"""
         # сначала добавляем
@@ -408,6 +642,25 @@ class PublicHabitTestCase(APITestCase):
             status.HTTP_200_OK
         )
 
+    def test_public_habit_list_cache(self):
+        """Тест кэширования публичного списка, ETag и сброса кэша при изменении публичной привычки"""
+        cache.clear()
+        self.habit_public = Habit.objects.create(**self.habit_data_public)
+        response = self.client.get(reverse('habits:public_useful_habit_list'))
+        etag = response['ETag']
+
+        # повторный запрос отдаётся из кэша без обращения к БД, пользователь тоже берётся из кэша
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('habits:public_useful_habit_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # привычка перестала быть публичной - кэш сброшен
+        self.habit_public.is_public = False
+        self.habit_public.save()
+        response = self.client.get(reverse('habits:public_useful_habit_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['count'], 0)
+
 
 class PublicNiceHabitTestCase(APITestCase):
     """Тест для контроллера PublicNiceHabitViewSet"""
@@ -464,6 +717,620 @@ class PublicNiceHabitTestCase(APITestCase):
             response.status_code,
             status.HTTP_200_OK
         )
+
+class AsyncViewsTestCase(APITestCase):
+    """Тест асинхронных контроллеров: ответы совпадают с синхронными"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='test@test.ru')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.habit_data = {
+            'title': 'Test habit',
+            'place': 'street',
+            'time': '10:00:00',
+            'action': 'run!',
+            'period': '1',
+            'reward': 'eat banana!',
+            'durations': 60,
+            'is_public': True,
+        }
+
+    def test_async_habit_crud(self):
+        """Тест создания, вывода, изменения и удаления полезной привычки асинхронным контроллером"""
+        nice_habit = NiceHabit.objects.create(title='Nice', action='rest', owner=self.user)
+        data = {**self.habit_data, 'reward': None, 'nice_habit': nice_habit.pk}
+        response = self.client.post(reverse('habits:async_useful-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        pk = response.json()['id']
+        self.assertEqual(response.json()['nice_habit_description']['title'], 'Nice')
+        self.assertTrue(HabitSchedule.objects.filter(habit_id=pk).exists())
+
+        for sync_url, async_url in (
+                (reverse('habits:useful-list'), reverse('habits:async_useful-list')),
+                (reverse('habits:useful-detail', args=[pk]), reverse('habits:async_useful-detail', args=[pk])),
+                (reverse('habits:nice-list'), reverse('habits:async_nice-list')),
+                (reverse('habits:public_useful_habit_list'), reverse('habits:async_public_useful_habit_list')),
+                (f'{reverse("habits:useful-list")}?pagination=cursor',
+                 f'{reverse("habits:async_useful-list")}?pagination=cursor'),
+        ):
+            async_response = self.client.get(async_url)
+            self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+            self.assertEqual(async_response.json(), self.client.get(sync_url).json())
+
+        response = self.client.patch(reverse('habits:async_useful-detail', args=[pk]), {'title': 'Changed'},
+                                     format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # изменение сбрасывает кэш пользователя, как и в синхронном контроллере
+        self.assertEqual(self.client.get(reverse('habits:useful-detail', args=[pk])).json()['title'], 'Changed')
+        response = self.client.patch(reverse('habits:async_useful-detail', args=[pk]), {'durations': 500},
+                                     format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.delete(reverse('habits:async_useful-detail', args=[pk]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Habit.objects.exists())
+        response = self.client.get(reverse('habits:async_useful-detail', args=[pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_async_public_nice_list(self):
+        """Тест вывода публичных приятных привычек асинхронным контроллером"""
+        NiceHabit.objects.create(title='Nice', action='rest', owner=self.user, is_public=True)
+        response = self.client.get(reverse('habits:async_public_nice_habit_list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), self.client.get(reverse('habits:public_nice_habit_list')).json())
+        self.assertIn('ETag', response)
+
+    def test_async_permissions(self):
+        """Тест, что чужие привычки и запросы без аутентификации недоступны"""
+        other = User.objects.create(email='other@test.ru')
+        habit = Habit.objects.create(**self.habit_data, owner=other)
+        response = self.client.get(reverse('habits:async_useful-detail', args=[habit.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(reverse('habits:async_public_useful_habit_list'))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+        # первый аутентификатор - сессии без заголовка WWW-Authenticate, поэтому 403, как в APIView
+        self.client.credentials()
+        response = self.client.get(reverse('habits:async_useful-list'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_async_user_create(self):
+        """Тест создания пользователя асинхронным контроллером"""
+        self.client.credentials()
+        userdata = {'email': 'new@test.ru', 'password': '12345'}
+        response = self.client.post(reverse('users:async_create_user'), userdata)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(User.objects.get(email='new@test.ru').check_password('12345'))
+        response = self.client.post(reverse('users:async_create_user'), userdata)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ScheduleTestCase(APITestCase):
+    """Тест индекса расписания HabitSchedule и рассылки run_habits"""
+
+    def setUp(self):
+        """Заполняем БД перед началом тестов"""
+        self.user = User.objects.create(email='test@test.ru', telegram=12345)
+        self.habit = Habit.objects.create(
+            title='Test habit',
+            time='10:00:00',
+            action='run!',
+            period='13',
+            owner=self.user
+        )
+
+    def test_schedule_created(self):
+        """Тест создания слотов расписания при сохранении привычки"""
+        self.assertEqual(
+            sorted(self.habit.schedule.values_list('minute_of_week', flat=True)),
+            [600, 2 * 1440 + 600]
+        )
+
+    def test_schedule_message(self):
+        """Тест готового текста напоминания в слотах: без пустого места, на языке владельца"""
+        self.assertEqual(
+            set(self.habit.schedule.values_list('chat_id', 'text')),
+            {(12345, 'Выполните: run!, у вас есть 120 секунд.')}
+        )
+        self.user.language = 'en'
+        self.user.telegram = 54321
+        self.user.save(update_fields=['language', 'telegram'])
+        self.habit.place = 'park'
+        self.habit.reward = 'banana'
+        self.habit.save()
+        self.assertEqual(
+            set(self.habit.schedule.values_list('chat_id', 'text')),
+            {(54321, 'Time to run! park, you have 120 seconds. Your reward: banana')}
+        )
+
+    def test_weekdays_mask(self):
+        """Тест вычисления битовой маски дней недели из строки period"""
+        self.assertEqual(self.habit.weekdays, 0b101)
+        self.assertEqual(weekdays_to_days(self.habit.weekdays), [1, 3])
+
+    def test_schedule_updated(self):
+        """Тест перестроения слотов расписания при изменении привычки"""
+        self.habit.time = '11:30:00'
+        self.habit.period = '7'
+        self.habit.save()
+        self.assertEqual(
+            list(self.habit.schedule.values_list('minute_of_week', flat=True)),
+            [6 * 1440 + 690]
+        )
+
+    def test_schedule_timezone(self):
+        """Тест перевода расписания в UTC по часовому поясу владельца, в том числе с переходом через неделю"""
+        self.user.timezone = 'Europe/Moscow'
+        self.user.save()
+        self.assertEqual(
+            sorted(self.habit.schedule.values_list('minute_of_week', flat=True)),
+            [420, 2 * 1440 + 420]
+        )
+        self.habit.time = '01:00:00'
+        self.habit.period = '1'
+        self.habit.save()
+        self.assertEqual(
+            list(self.habit.schedule.values_list('minute_of_week', flat=True)),
+            [6 * 1440 + 22 * 60]
+        )
+
+    def test_utc_minutes_daylight_saving(self):
+        """Тест учёта летнего времени: смещение берётся на ближайшую дату с нужным днём недели"""
+        summer = list(get_utc_minutes_of_week(0b1, time(10, 0), 'Europe/Berlin',
+                                              now=datetime(2023, 7, 1, tzinfo=timezone.utc)))
+        winter = list(get_utc_minutes_of_week(0b1, time(10, 0), 'Europe/Berlin',
+                                              now=datetime(2023, 12, 1, tzinfo=timezone.utc)))
+        self.assertEqual(summer, [8 * 60])
+        self.assertEqual(winter, [9 * 60])
+
+    def test_utc_minutes_transition_day(self):
+        """
+        Тест перестроения в день перехода на летнее время: время, которое сегодня уже прошло
+        до перехода, получает смещение следующей недели
+        """
+        # воскресенье 29.03.2026, переход в Берлине в 01:00 UTC, перестроение после него
+        now = datetime(2026, 3, 29, 1, 30, tzinfo=timezone.utc)
+        self.assertEqual(list(get_utc_minutes_of_week(0b1000000, time(1, 0), 'Europe/Berlin', now=now)),
+                         [5 * 1440 + 23 * 60])
+        # время после перехода сегодня ещё не наступило
+        self.assertEqual(list(get_utc_minutes_of_week(0b1000000, time(10, 0), 'Europe/Berlin', now=now)),
+                         [6 * 1440 + 8 * 60])
+
+    @patch('habits.services.build_owner_schedule')
+    def test_refresh_schedule_once_per_transition(self, mock_build):
+        """Тест, что расписание пояса перестраивается один раз после перехода на летнее время, а не каждый час"""
+        self.user.timezone = 'Europe/Berlin'
+        self.user.save()
+        before = datetime(2023, 3, 20, 12, 0, tzinfo=timezone.utc)
+        after = datetime(2023, 3, 26, 2, 0, tzinfo=timezone.utc)  # переход в 01:00 UTC
+        for now in (before, before + timedelta(hours=1), before + timedelta(days=5)):
+            refresh_schedule(now)
+        self.assertEqual(mock_build.call_count, 1)  # первый запуск без записи о поясе
+        for now in (after, after + timedelta(hours=1), after + timedelta(days=8)):
+            refresh_schedule(now)
+        self.assertEqual(mock_build.call_count, 2)
+        self.assertEqual(ScheduleTimezone.objects.get(timezone='Europe/Berlin').utc_offset, 120)
+
+    @patch('habits.tasks.send_outbox.delay')
+    @patch('habits.services.datetime')
+    def test_run_habits(self, mock_datetime, mock_delay):
+        """Тест записи в очередь Outbox привычек из текущего слота расписания и запуска её разбора"""
+        mock_datetime.now.return_value = datetime(2023, 8, 23, 10, 0)  # среда
+        with self.captureOnCommitCallbacks(execute=True):
+            run_habits()
+        self.assertEqual(
+            list(Outbox.objects.values_list('key', 'chat_id', 'text', 'status')),
+            [('reminder:12345:2023-08-23T10:00:00:0', 12345,
+              'Выполните: run!, у вас есть 120 секунд.', Outbox.PENDING)]
+        )
+        mock_delay.assert_called_once_with()
+
+    @patch('habits.services.datetime')
+    def test_run_habits_catch_up(self, mock_datetime):
+        """Тест, что после пропущенных тиков в очередь ставятся привычки всех пропущенных минут, но не повторно"""
+        SchedulerState.objects.create(name=REMINDERS_SCHEDULER, last_minute=datetime(2023, 8, 23, 9, 55))
+        mock_datetime.now.return_value = datetime(2023, 8, 23, 10, 5)
+        result = run_habits()
+        self.assertEqual(list(Outbox.objects.values_list('key', flat=True)),
+                         ['reminder:12345:2023-08-23T10:00:00:0'])
+        self.assertEqual(result['minutes'], 10)
+
+        mock_datetime.now.return_value = datetime(2023, 8, 23, 10, 6)
+        run_habits()
+        self.assertEqual(Outbox.objects.count(), 1)
+
+    @patch('habits.services.datetime')
+    def test_run_habits_lag(self, mock_datetime):
+        """Тест, что отставание считается от самой ранней минуты тика и не учитывается без сообщений"""
+        SchedulerState.objects.create(name=REMINDERS_SCHEDULER, last_minute=datetime(2023, 8, 23, 9, 55))
+        lag = REGISTRY.get_sample_value('reminder_tick_lag_seconds_count') or 0
+        mock_datetime.now.return_value = datetime(2023, 8, 23, 10, 5, 30)
+        self.assertEqual(run_habits()['lag'], 9 * 60 + 30)
+
+        mock_datetime.now.return_value = datetime(2023, 8, 23, 10, 6, 30)
+        self.assertIsNone(run_habits()['lag'])
+        self.assertEqual(REGISTRY.get_sample_value('reminder_tick_lag_seconds_count'), lag + 1)
+
+    @patch('habits.services.datetime')
+    def test_run_habits_idempotent(self, mock_datetime):
+        """Тест, что повторная обработка той же минуты не ставит напоминание в очередь второй раз"""
+        mock_datetime.now.return_value = datetime(2023, 8, 23, 10, 0)
+        run_habits()
+        SchedulerState.objects.all().delete()
+        run_habits()
+        self.assertEqual(Outbox.objects.count(), 1)
+
+
+class OutboxTestCase(APITestCase):
+    """Тест разбора очереди исходящих напоминаний Outbox"""
+
+    def setUp(self):
+        """Заполняем очередь перед началом тестов"""
+        self.now = utcnow()
+        self.messages = [
+            Outbox.objects.create(key=f'reminder:useful:{number}:2023-08-23T10:00:00', chat_id=number,
+                                  text='run!', next_attempt_at=self.now - timedelta(minutes=1))
+            for number in (1, 2)
+        ]
+
+    @patch('habits.services.send_telegram_messages')
+    def test_drain_sent(self, mock_send):
+        """Тест отметки доставленных напоминаний"""
+        mock_send.side_effect = lambda messages: [DeliveryResult(chat_id, True, None, None, 0)
+                                                  for chat_id, text in messages]
+        self.assertEqual(drain_outbox(), {'sent': 2, 'retried': 0, 'failed': 0})
+        self.assertEqual(set(Outbox.objects.values_list('status', flat=True)), {Outbox.SENT})
+        self.assertFalse(Outbox.objects.filter(sent_at__isnull=True).exists())
+        self.assertEqual(drain_outbox(), {'sent': 0, 'retried': 0, 'failed': 0})
+
+    @patch('habits.services.send_telegram_messages')
+    def test_drain_retry(self, mock_send):
+        """Тест откладывания неудачных отправок: retry_after от Telegram или экспоненциальная пауза"""
+        mock_send.return_value = [DeliveryResult(1, False, 300, 'Too Many Requests', 0),
+                                  DeliveryResult(2, False, None, 'Bad Gateway', 0)]
+        self.assertEqual(drain_outbox(), {'sent': 0, 'retried': 2, 'failed': 0})
+        first, second = Outbox.objects.order_by('chat_id')
+        self.assertEqual((first.attempts, first.status, first.error), (1, Outbox.PENDING, 'Too Many Requests'))
+        self.assertGreaterEqual(first.next_attempt_at, self.now + timedelta(seconds=300))
+        self.assertLess(second.next_attempt_at, self.now + timedelta(seconds=300))
+        self.assertGreaterEqual(second.next_attempt_at, self.now + timedelta(seconds=30))
+
+        # до наступления следующей попытки записи не выбираются
+        mock_send.reset_mock()
+        drain_outbox()
+        mock_send.assert_not_called()
+
+    def test_retry_delay(self):
+        """Тест экспоненциального роста паузы между попытками с ограничением сверху"""
+        self.assertEqual(get_retry_delay(1), timedelta(seconds=30))
+        self.assertEqual(get_retry_delay(3), timedelta(seconds=120))
+        self.assertEqual(get_retry_delay(3, retry_after=500), timedelta(seconds=500))
+        self.assertEqual(get_retry_delay(20), timedelta(hours=1))
+
+    @override_settings(REMINDER_MAX_ATTEMPTS=1)
+    @patch('habits.services.send_telegram_messages')
+    def test_drain_failed(self, mock_send):
+        """Тест, что после исчерпания попыток напоминание помечается как неотправленное"""
+        mock_send.side_effect = lambda messages: [DeliveryResult(chat_id, False, None, 'Forbidden', 0)
+                                                  for chat_id, text in messages]
+        self.assertEqual(drain_outbox(), {'sent': 0, 'retried': 0, 'failed': 2})
+        self.assertEqual(set(Outbox.objects.values_list('status', flat=True)), {Outbox.FAILED})
+
+    def test_compact(self):
+        """Тест очистки обработанных записей старше срока хранения"""
+        Outbox.objects.filter(chat_id=1).update(status=Outbox.SENT, sent_at=self.now)
+        Outbox.objects.update(created_at=self.now - timedelta(days=2))
+        self.assertEqual(compact_outbox(), 1)
+        self.assertEqual(list(Outbox.objects.values_list('chat_id', flat=True)), [2])
+
+
+class ReminderQueriesTestCase(APITestCase):
+    """Тест количества запросов к БД при рассылке напоминаний"""
+
+    def setUp(self):
+        """Заполняем БД перед началом тестов: у каждой привычки свой владелец"""
+        self.habits = []
+        self.nice_habits = []
+        for number in range(5):
+            owner = User.objects.create(email=f'test{number}@test.ru', telegram=number + 1)
+            nice_habit = NiceHabit.objects.create(title='Nice', time='10:00:00', action='rest', owner=owner)
+            self.nice_habits.append(nice_habit)
+            self.habits.append(Habit.objects.create(
+                title='Test habit', time='10:00:00', action='run!', owner=owner, nice_habit=nice_habit
+            ))
+        # привычка владельца без telegram id не должна попадать в рассылку
+        self.habit_without_telegram = Habit.objects.create(
+            title='Test habit', time='10:00:00', action='run!',
+            owner=User.objects.create(email='no_telegram@test.ru')
+        )
+
+    @patch('habits.services.datetime')
+    def test_run_habits_queries(self, mock_datetime):
+        """Тест, что выбор привычек для рассылки не зависит от их количества и пропускает владельцев без telegram"""
+        mock_datetime.now.return_value = datetime(2023, 8, 23, 10, 0)
+        SchedulerState.objects.create(name=REMINDERS_SCHEDULER, last_minute=datetime(2023, 8, 23, 9, 59))
+        # точка сохранения, блокировка состояния, курсор по расписанию, вставка в Outbox,
+        # запись отметки, выход из точки
+        with self.assertNumQueries(6):
+            self.assertEqual(run_habits()['messages'], 5)
+        self.assertEqual(sorted(Outbox.objects.values_list('chat_id', flat=True)), [1, 2, 3, 4, 5])
+
+    def test_due_messages(self):
+        """Тест объединения напоминаний получателя за минуту в одно сообщение при чтении порциями"""
+        moment = datetime(2023, 8, 23, 10, 0)
+        messages = list(get_due_messages(moment, moment, batch_size=3))
+        self.assertEqual([key for key, chat_id, text in messages],
+                         [f'reminder:{number}:2023-08-23T10:00:00:0' for number in range(1, 6)])
+        self.assertEqual(
+            messages[0][2],
+            'Выполните: run!, у вас есть 120 секунд.\n\nНасладитесь: rest, у вас есть 120 секунд.'
+        )
+
+    @patch('habits.services.send_telegram_messages')
+    @patch('habits.services.datetime')
+    def test_drain_outbox_queries(self, mock_datetime, mock_send):
+        """Тест, что разбор пачки очереди не зависит от её размера и не обращается к привычкам и владельцам"""
+        mock_datetime.now.return_value = datetime(2023, 8, 23, 10, 0)
+        mock_send.side_effect = lambda messages: [DeliveryResult(chat_id, chat_id != 5, None, None, 0)
+                                                  for chat_id, text in messages]
+        run_habits()
+        mock_datetime.now.return_value = datetime(2023, 8, 23, 10, 1)
+        # точка сохранения, выборка с блокировкой, отметка отправленных, отложенные, выход из точки
+        with self.assertNumQueries(5):
+            self.assertEqual(drain_outbox(), {'sent': 4, 'retried': 1, 'failed': 0})
+        chat_ids = [chat_id for call in mock_send.call_args_list for chat_id, text in call.args[0]]
+        self.assertEqual(sorted(chat_ids), [1, 2, 3, 4, 5])
+
+
+class SplitMessageTestCase(SimpleTestCase):
+    """Тест объединения напоминаний в сообщения с ограничением длины"""
+
+    def test_split_message(self):
+        """Тест, что тексты объединяются, пока помещаются, а слишком длинный текст режется на части"""
+        self.assertEqual(split_message(['a', 'b']), ['a\n\nb'])
+        self.assertEqual(split_message(['a' * 3, 'b' * 3, 'c'], limit=8), ['aaa\n\nbbb', 'c'])
+        self.assertEqual(split_message(['a' * 10], limit=4), ['aaaa', 'aaaa', 'aa'])
+        self.assertTrue(all(len(text) <= MESSAGE_LIMIT for text in split_message(['x' * 3000] * 3)))
+
+
+class DatabaseConnectionsTestCase(SimpleTestCase):
+    """Тест настройки соединений с БД для воркеров Celery"""
+
+    def test_configure_db_connections(self):
+        """Тест, что постоянные соединения отключаются только в пулах с зелёными нитями"""
+        with patch.dict(settings.DATABASES['default']):
+            configure_db_connections('prefork', 4)
+            self.assertEqual(settings.DATABASES['default']['CONN_MAX_AGE'], 60)
+            with self.assertLogs('conf.celery', 'WARNING'):
+                configure_db_connections('eventlet', 1000)
+            self.assertEqual(settings.DATABASES['default']['CONN_MAX_AGE'], 0)
+        self.assertTrue(settings.DATABASES['default']['CONN_HEALTH_CHECKS'])
+
+
+class SettingsTestCase(SimpleTestCase):
+    """Тест чтения настроек из переменных окружения"""
+
+    def test_secret_key_required(self):
+        """Тест, что в рабочем режиме без SECRET_KEY настройки не загружаются, а в режиме отладки загружаются"""
+        script = 'from django.conf import settings; print(settings.SECRET_KEY)'
+        env = {key: value for key, value in os.environ.items() if key != 'SECRET_KEY'}
+        env['DJANGO_SETTINGS_MODULE'] = 'conf.settings'
+        result = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR,
+                                env={**env, 'DEBUG': '0'}, capture_output=True, text=True)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('ImproperlyConfigured', result.stderr)
+        result = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR,
+                                env={**env, 'DEBUG': '0', 'SECRET_KEY': 'secret'}, capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip(), 'secret')
+        result = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR,
+                                env={**env, 'DEBUG': '1'}, capture_output=True, text=True)
+        self.assertTrue(result.stdout.startswith('django-insecure-'))
+
+
+# процесс, который учитывает одно отправленное сообщение и выводит сумму по всем процессам
+MULTIPROCESS_METRICS_SCRIPT = '''
+from habits.metrics import MESSAGES, get_registry
+MESSAGES.labels('sent').inc()
+print(get_registry().get_sample_value('telegram_messages_total', {'status': 'sent'}))
+'''
+
+
+class MetricsTestCase(SimpleTestCase):
+    """Тест сбора метрик нескольких процессов (рабочие процессы gunicorn, пул prefork Celery)"""
+
+    def test_multiprocess_registry(self):
+        """Тест, что при PROMETHEUS_MULTIPROC_DIR вывод метрик суммирует значения всех процессов"""
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': directory}
+            outputs = [
+                subprocess.run([sys.executable, '-c', MULTIPROCESS_METRICS_SCRIPT], cwd=settings.BASE_DIR, env=env,
+                               capture_output=True, text=True, check=True).stdout.strip()
+                for _ in range(2)
+            ]
+        self.assertEqual(outputs, ['1.0', '2.0'])
+
+
+class WarmUpTestCase(SimpleTestCase):
+    """Тест подготовки приложения при загрузке рабочего процесса"""
+
+    def test_warm_up(self):
+        """Тест, что планы вывода всех сериализаторов строятся заранее"""
+        for serializer_class in (HabitSerializer, NiceHabitSerializer, PublicHabitSerializer):
+            if '_values_plan' in serializer_class.__dict__:
+                del serializer_class._values_plan
+        warm_up()
+        for serializer_class in (HabitSerializer, NiceHabitSerializer, PublicHabitSerializer):
+            self.assertIn('_values_plan', serializer_class.__dict__)
+        self.assertIn('habits', get_resolver().namespace_dict)
+
+    def test_parse_importtime(self):
+        """Тест разбора вывода python -X importtime по пакетам верхнего уровня"""
+        output = ('import time: self [us] | cumulative | imported package\n'
+                  'import time:       500 |        500 |     redis.client\n'
+                  'import time:      1500 |       2000 |   redis\n'
+                  'import time:      3000 |       5000 | habits.services\n')
+        self.assertEqual(parse_importtime(output), {'habits': 3.0, 'redis': 2.0})
+
+
+class DocsTestCase(APITestCase):
+    """Тест документации API, drf_yasg загружается при первом обращении"""
+
+    def test_docs(self):
+        """Тест страниц документации и схемы API: схема строится без ошибок в контроллерах привычек владельца"""
+        for name in ('schema-swagger-ui', 'schema-redoc'):
+            self.assertEqual(self.client.get(reverse(name)).status_code, status.HTTP_200_OK)
+        with self.assertNoLogs('drf_yasg', 'WARNING'):
+            response = self.client.get(reverse('schema-swagger-ui'), {'format': 'openapi'})
+        self.assertIn('/habits/useful/', response.json()['paths'])
+
+
+class FakeBotAPIHandler(BaseHTTPRequestHandler):
+    """Локальный сервер, имитирующий метод sendMessage Telegram Bot API"""
+    received = []
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.received.append(data)
+        if data['chat_id'] == 429:
+            answer = {'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                      'parameters': {'retry_after': 5}}
+        else:
+            answer = {'ok': True, 'result': {}}
+        body = json.dumps(answer).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# рассылка из зелёных нитей воркера Celery с пулом eventlet, выполняется в отдельном процессе интерпретатора
+EVENTLET_DELIVERY_SCRIPT = '''
+import httpcore  # до подмены модулей: httpcore при импорте проверяет trio, если тот установлен
+import eventlet
+eventlet.monkey_patch()
+
+import django
+django.setup()
+from habits.services import send_telegram_messages
+
+pool = eventlet.GreenPool()
+batches = pool.imap(lambda chat_id: send_telegram_messages([(chat_id, 'hi')]), range(1, 6))
+print(sum(result.ok for batch in batches for result in batch))
+'''
+
+
+class TelegramDeliveryTestCase(SimpleTestCase):
+    """Тест асинхронной рассылки TelegramDelivery на локальном сервере Bot API"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeBotAPIHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        FakeBotAPIHandler.received = []
+        self.delivery = TelegramDelivery(
+            token='test',
+            api_url=f'http://127.0.0.1:{self.server.server_port}',
+            global_rate=1000,
+            chat_rate=1000
+        )
+
+    def test_deliver(self):
+        """Тест отправки пачки сообщений и подсчёта статистики"""
+        results = self.delivery.deliver([(1, 'first'), (2, 'second'), (1, 'third')])
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(self.delivery.stats.sent, 3)
+        self.assertEqual(sorted(data['text'] for data in FakeBotAPIHandler.received), ['first', 'second', 'third'])
+
+    def test_deliver_retry_after(self):
+        """Тест разбора ответа 429 с параметром retry_after"""
+        result = self.delivery.deliver([(429, 'flood')])[0]
+        self.assertFalse(result.ok)
+        self.assertEqual(result.retry_after, 5)
+        self.assertEqual(self.delivery.stats.failed, 1)
+
+    def test_chat_buckets_dropped(self):
+        """Тест, что вёдра чатов, успевшие заполниться, удаляются и не копятся в долго работающем процессе"""
+        with patch('habits.telegram.time.monotonic', return_value=100.0):
+            delivery = TelegramDelivery(token='test', chat_rate=1)
+            for chat_id in range(3):
+                asyncio.run(delivery._chat_bucket(chat_id).acquire())
+        with patch('habits.telegram.time.monotonic', return_value=100.5):
+            asyncio.run(delivery._chat_bucket(3).acquire())
+            self.assertEqual(sorted(delivery.chat_buckets), [0, 1, 2, 3])
+        with patch('habits.telegram.time.monotonic', return_value=101.2):
+            delivery._chat_bucket(4)
+            self.assertEqual(sorted(delivery.chat_buckets), [3, 4])
+
+    def test_get_delivery(self):
+        """Тест, что задачи процесса отправляют напрямую через одну рассылку с общими ограничениями скорости"""
+        get_delivery.cache_clear()
+        self.addCleanup(get_delivery.cache_clear)
+        self.assertIs(get_delivery(), get_delivery())
+
+    def test_deliver_eventlet(self):
+        """Тест одновременной отправки напрямую из зелёных нитей eventlet в одном потоке ОС"""
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'conf.settings', 'TELEGRAM_TRANSPORT': 'direct',
+               'TELEGRAM_TOKEN': 'test', 'TELEGRAM_API_URL': f'http://127.0.0.1:{self.server.server_port}'}
+        completed = subprocess.run([sys.executable, '-W', 'ignore', '-c', EVENTLET_DELIVERY_SCRIPT],
+                                   cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=60)
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        self.assertEqual(completed.stdout.split()[-1], '5')
+        self.assertEqual(len(FakeBotAPIHandler.received), 5)
+
+    def test_gateway_handle(self):
+        """Тест обработки запроса шлюзом: отправка через общий пул и ответ в ключ запроса"""
+        gateway = TelegramGateway(url='redis://localhost:6379/15', queue='test', delivery=self.delivery)
+        gateway.redis = AsyncMock()
+        payload = json.dumps({'id': 'abc', 'deadline': time_module.time() + 60, 'messages': [[1, 'hi'], [429, 'x']]})
+
+        async def handle():
+            async with self.delivery.client() as client:
+                await gateway.handle(client, asyncio.Semaphore(2), payload)
+
+        sent = REGISTRY.get_sample_value('telegram_messages_total', {'status': 'sent'}) or 0
+        asyncio.run(handle())
+        self.assertEqual(REGISTRY.get_sample_value('telegram_messages_total', {'status': 'sent'}), sent + 1)
+        key, reply = gateway.redis.rpush.call_args.args
+        self.assertEqual(key, 'test:reply:abc')
+        self.assertEqual([(chat_id, ok, retry_after) for chat_id, ok, retry_after, *_ in json.loads(reply)],
+                         [(1, True, None), (429, False, 5)])
+
+    def test_gateway_skips_expired(self):
+        """Тест, что шлюз не отправляет запросы, ответа на которые клиент уже не ждёт"""
+        gateway = TelegramGateway(url='redis://localhost:6379/15', queue='test', delivery=self.delivery)
+        gateway.redis = AsyncMock()
+        payload = json.dumps({'id': 'abc', 'deadline': time_module.time() - 1, 'messages': [[1, 'hi']]})
+        with self.assertLogs('habits.gateway', 'WARNING'):
+            asyncio.run(gateway.handle(None, None, payload))
+        self.assertEqual(FakeBotAPIHandler.received, [])
+        gateway.redis.rpush.assert_not_called()
+
+    def test_gateway_client(self):
+        """Тест клиента шлюза: разбор ответа и неудача всех сообщений, если шлюз не ответил"""
+        client = GatewayClient(url='redis://localhost:6379/15', queue='test', timeout=1)
+        client.redis = MagicMock()
+        client.redis.blpop.return_value = (b'test:reply', json.dumps([[1, True, None, None, 0.1]]))
+        self.assertEqual(client.deliver([(1, 'hi')]), [DeliveryResult(1, True, None, None, 0.1)])
+        request = json.loads(client.redis.rpush.call_args.args[1])
+        self.assertEqual(request['messages'], [[1, 'hi']])
+
+        client.redis.blpop.return_value = None
+        self.assertFalse(client.deliver([(1, 'hi')])[0].ok)
+
 # запуск тестов: python manage.py test
 # запуск подсчёта покрытия кода тестами: coverage run --source='.' manage.py test
 # вывод отчёта о покрытии тестами: coverage report
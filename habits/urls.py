@@ -2,7 +2,10 @@ from django.urls import path
 from rest_framework import routers
 
 from habits.apps import HabitsConfig
-from habits.views import HabitViewSet, NiceHabitViewSet, PublicHabitListView, PublicNiceHabitListView
+from habits.asyncapi import DETAIL_ACTIONS, LIST_ACTIONS
+from habits.views import (AsyncHabitViewSet, AsyncNiceHabitViewSet, AsyncPublicHabitListView,
+                          AsyncPublicNiceHabitListView, HabitViewSet, NiceHabitViewSet, PublicHabitListView,
+                          PublicNiceHabitListView)
 
 app_name = HabitsConfig.name
 
@@ -11,6 +14,16 @@ urlpatterns = [
     path('public/nice/', PublicNiceHabitListView.as_view(), name='public_nice_habit_list'),
 ]
 
+# асинхронные контроллеры для ASGI, работают параллельно с синхронными по адресам с префиксом async/
+urlpatterns += [
+    path('async/public/useful/', AsyncPublicHabitListView.as_view(), name='async_public_useful_habit_list'),
+    path('async/public/nice/', AsyncPublicNiceHabitListView.as_view(), name='async_public_nice_habit_list'),
+    path('async/useful/', AsyncHabitViewSet.as_view(LIST_ACTIONS), name='async_useful-list'),
+    path('async/useful/<int:pk>/', AsyncHabitViewSet.as_view(DETAIL_ACTIONS), name='async_useful-detail'),
+    path('async/nice/', AsyncNiceHabitViewSet.as_view(LIST_ACTIONS), name='async_nice-list'),
+    path('async/nice/<int:pk>/', AsyncNiceHabitViewSet.as_view(DETAIL_ACTIONS), name='async_nice-detail'),
+]
+
 router_useful_habits = routers.SimpleRouter()
 router_useful_habits.register(r'useful', HabitViewSet, basename='useful')
 
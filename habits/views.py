@@ -1,14 +1,24 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from rest_framework.generics import ListAPIView
 from rest_framework.viewsets import ModelViewSet
 
+from habits.asyncapi import AsyncOwnerViewSet, AsyncPublicListView
+from habits.caching import CachedListMixin, CachedOwnerMixin, PUBLIC_HABITS, PUBLIC_NICE_HABITS
+from habits.metrics import get_registry
+from habits.mixins import BulkHabitMixin, ValuesListMixin
 from habits.models import Habit, NiceHabit
+from habits.paginators import HabitPagination
 from habits.permissions import IsOwner
 from habits.serializers import HabitSerializer, NiceHabitSerializer, PublicHabitSerializer, PublicNiceHabitSerializer
 
 
-class HabitViewSet(ModelViewSet):
+class HabitViewSet(CachedOwnerMixin, ValuesListMixin, BulkHabitMixin, ModelViewSet):
     """
-    Контроллер полезных привычек
+    Контроллер полезных привычек, массовые операции - useful/bulk/ (см. BulkHabitMixin),
+    ответы списка и просмотра кэшируются до изменения привычек пользователя (см. CachedOwnerMixin)
     Обязательные поля модели Habit:
         title: CharField, max_length=30, название привычки
         action: CharField, max_length=100, короткое описание действия
@@ -27,25 +37,29 @@ class HabitViewSet(ModelViewSet):
         is_public: BooleanField, default=False, признак публичности привычки, если True, привычку могут
         просматривать все пользователи ресурса
     """
-    queryset = Habit.objects.all()
+    queryset = Habit.objects.select_related('nice_habit')
     serializer_class = HabitSerializer
     permission_classes = [IsOwner]
+    pagination_class = HabitPagination
+    bulk_select_related = ('owner', 'nice_habit')
 
     def get_queryset(self):
         """Показывает только привычки, принадлежащие текущему пользователю"""
         queryset = super().get_queryset()
+        # drf_yasg строит схему API без пользователя
+        if getattr(self, 'swagger_fake_view', False):
+            return queryset.none()
         return queryset.filter(owner=self.request.user)
 
     def perform_create(self, serializer):
-        """Добавляет текущего пользователя в качестве владельца созданной привычки"""
-        new_habit = serializer.save()
-        new_habit.owner = self.request.user
-        new_habit.save()
+        """Добавляет текущего пользователя в качестве владельца до записи привычки в БД"""
+        serializer.save(owner=self.request.user)
 
 
-class NiceHabitViewSet(ModelViewSet):
+class NiceHabitViewSet(CachedOwnerMixin, ValuesListMixin, BulkHabitMixin, ModelViewSet):
     """
-    Контроллер приятных привычек
+    Контроллер приятных привычек, массовые операции - nice/bulk/ (см. BulkHabitMixin),
+    ответы списка и просмотра кэшируются до изменения привычек пользователя (см. CachedOwnerMixin)
     Обязательные поля модели NiceHabit:
         title: CharField, max_length=30, название привычки
         action: CharField, max_length=100, короткое описание действия
@@ -61,26 +75,74 @@ class NiceHabitViewSet(ModelViewSet):
     queryset = NiceHabit.objects.all()
     serializer_class = NiceHabitSerializer
     permission_classes = [IsOwner]
+    pagination_class = HabitPagination
 
     def get_queryset(self):
         """Показывает только привычки, принадлежащие текущему пользователю"""
         queryset = super().get_queryset()
+        # drf_yasg строит схему API без пользователя
+        if getattr(self, 'swagger_fake_view', False):
+            return queryset.none()
         return queryset.filter(owner=self.request.user)
 
     def perform_create(self, serializer):
-        """Добавляет текущего пользователя в качестве владельца созданной привычки"""
-        new_habit = serializer.save()
-        new_habit.owner = self.request.user
-        new_habit.save()
+        """Добавляет текущего пользователя в качестве владельца до записи привычки в БД"""
+        serializer.save(owner=self.request.user)
 
 
-class PublicHabitListView(ListAPIView):
-    """Контроллер вывода публичных полезных привычек"""
+class PublicHabitListView(CachedListMixin, ValuesListMixin, ListAPIView):
+    """Контроллер вывода публичных полезных привычек, ответы кэшируются до изменения публичных привычек"""
     serializer_class = PublicHabitSerializer
     queryset = Habit.objects.filter(is_public=True)
+    cache_scope = PUBLIC_HABITS
+    pagination_class = HabitPagination
 
 
-class PublicNiceHabitListView(ListAPIView):
-    """Контроллер вывода публичных приятных привычек"""
+class PublicNiceHabitListView(CachedListMixin, ValuesListMixin, ListAPIView):
+    """Контроллер вывода публичных приятных привычек, ответы кэшируются до изменения публичных привычек"""
     serializer_class = PublicNiceHabitSerializer
     queryset = NiceHabit.objects.filter(is_public=True)
+    cache_scope = PUBLIC_NICE_HABITS
+    pagination_class = HabitPagination
+
+
+class AsyncHabitViewSet(AsyncOwnerViewSet):
+    """Асинхронный контроллер полезных привычек для ASGI, поля как у HabitViewSet, без массовых операций"""
+    queryset = Habit.objects.select_related('nice_habit')
+    serializer_class = HabitSerializer
+    pagination_class = HabitPagination
+
+
+class AsyncNiceHabitViewSet(AsyncOwnerViewSet):
+    """Асинхронный контроллер приятных привычек для ASGI, поля как у NiceHabitViewSet, без массовых операций"""
+    queryset = NiceHabit.objects.all()
+    serializer_class = NiceHabitSerializer
+    pagination_class = HabitPagination
+
+
+class AsyncPublicHabitListView(AsyncPublicListView):
+    """Асинхронный контроллер вывода публичных полезных привычек для ASGI"""
+    serializer_class = PublicHabitSerializer
+    queryset = Habit.objects.filter(is_public=True)
+    cache_scope = PUBLIC_HABITS
+    pagination_class = HabitPagination
+
+
+class AsyncPublicNiceHabitListView(AsyncPublicListView):
+    """Асинхронный контроллер вывода публичных приятных привычек для ASGI"""
+    serializer_class = PublicNiceHabitSerializer
+    queryset = NiceHabit.objects.filter(is_public=True)
+    cache_scope = PUBLIC_NICE_HABITS
+    pagination_class = HabitPagination
+
+
+def metrics_view(request):
+    """
+    Контроллер вывода метрик рассылки и API в формате Prometheus. Доступен с адресов METRICS_ALLOWED_IPS
+    или с токеном METRICS_TOKEN в заголовке Authorization: Bearer <токен>
+    """
+    token = settings.METRICS_TOKEN
+    authorized = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
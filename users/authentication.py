@@ -0,0 +1,108 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BasicAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from users.caching import get_user_cache_key
+
+
+def get_cached_user(user_id):
+    """
+    Пользователь по id из кэша, при промахе читается из БД и кэшируется на AUTH_USER_CACHE_TIMEOUT секунд.
+    Запись удаляется при изменении и удалении пользователя (см. users.signals). Возвращает None,
+    если пользователя нет
+    """
+    key = get_user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user is None:
+            return None
+        cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+async def aget_cached_user(user_id):
+    """Асинхронный вариант get_cached_user для асинхронных контроллеров"""
+    key = get_user_cache_key(user_id)
+    user = await cache.aget(key)
+    if user is None:
+        user = await get_user_model().objects.filter(pk=user_id).afirst()
+        if user is None:
+            return None
+        await cache.aset(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication, которая берёт пользователя из токена через кэш get_cached_user, а не из БД.
+    aauthenticate - то же для асинхронных контроллеров (см. habits.asyncapi.AsyncAPIView)
+    """
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    def check_user(self, user):
+        if user is None:
+            raise exceptions.AuthenticationFailed(_('User not found'), code='user_not_found')
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+    def uses_cache(self):
+        return api_settings.USER_ID_FIELD == 'id' and not api_settings.CHECK_REVOKE_TOKEN
+
+    def get_user(self, validated_token):
+        if not self.uses_cache():
+            return super().get_user(validated_token)
+        return self.check_user(get_cached_user(self.get_user_id(validated_token)))
+
+    async def aget_user(self, validated_token):
+        if not self.uses_cache():
+            return await sync_to_async(super().get_user)(validated_token)
+        return self.check_user(await aget_cached_user(self.get_user_id(validated_token)))
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    BasicAuthentication, которая проверяет пароль хешированием PBKDF2 один раз и запоминает результат на
+    AUTH_USER_CACHE_TIMEOUT секунд. В кэше хранится только HMAC от email и пароля с SECRET_KEY, id
+    пользователя и хеш его пароля на момент проверки: после смены пароля запись перестаёт подходить
+    """
+
+    def get_credentials_key(self, userid, password):
+        return 'auth:basic:' + salted_hmac('users.authentication', f'{userid}:{password}').hexdigest()
+
+    def authenticate_credentials(self, userid, password, request=None):
+        key = self.get_credentials_key(userid, password)
+        cached = cache.get(key)
+        if cached is not None:
+            user_id, password_hash = cached
+            user = get_cached_user(user_id)
+            if user is not None and user.is_active and user.password == password_hash:
+                return user, None
+
+        user, auth = super().authenticate_credentials(userid, password, request)
+        cache.set(key, (user.pk, user.password), settings.AUTH_USER_CACHE_TIMEOUT)
+        return user, auth
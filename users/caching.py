@@ -0,0 +1,10 @@
+from django.core.cache import cache
+
+
+def get_user_cache_key(user_id):
+    """Ключ пользователя user_id в кэше аутентификации"""
+    return f'auth:user:{user_id}'
+
+
+def invalidate_user_cache(user_id):
+    cache.delete(get_user_cache_key(user_id))
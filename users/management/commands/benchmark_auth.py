@@ -0,0 +1,67 @@
+import base64
+
+from django.core.cache import cache
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from habits.benchmarks import measure, write_results
+from users.authentication import CachedBasicAuthentication, CachedJWTAuthentication
+from users.caching import get_user_cache_key
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Замеряет стоимость аутентификации одного запроса для JWT и BasicAuth без кэша и с кэшем '
+            'пользователя. Пользователь создаётся во временной транзакции')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200, help='повторов каждого замера')
+        parser.add_argument('--output', help='файл для результатов в JSON')
+
+    def bench(self, authentication, header, repeat, keys):
+        """
+        Замер authenticate на запросе с заголовком Authorization и число запросов к БД на один вызов.
+        Перед замером из кэша удаляются только ключи keys пользователя бенчмарка
+        """
+        request = Request(APIRequestFactory().get('/', HTTP_AUTHORIZATION=header))
+        cache.delete_many(keys)
+        # первый вызов прогревает кэш, в замер не входит
+        authentication.authenticate(request)
+        with CaptureQueriesContext(connection) as context:
+            result = measure(lambda number: authentication.authenticate(request), repeat)
+        result['queries_per_request'] = round(len(context.captured_queries) / repeat, 2)
+        return result
+
+    def handle(self, *args, **options):
+        password = 'benchmark-password'
+        with transaction.atomic():
+            user = User.objects.create(email='benchmark-auth@example.com')
+            user.set_password(password)
+            user.save()
+            jwt = f'Bearer {AccessToken.for_user(user)}'
+            basic = 'Basic ' + base64.b64encode(f'{user.email}:{password}'.encode()).decode()
+            # общий кэш не очищается: удаляются только записи пользователя бенчмарка
+            keys = [get_user_cache_key(user.pk), CachedBasicAuthentication().get_credentials_key(user.email, password)]
+            schemes = {
+                'jwt': (JWTAuthentication(), jwt),
+                'jwt_cached': (CachedJWTAuthentication(), jwt),
+                'basic': (BasicAuthentication(), basic),
+                'basic_cached': (CachedBasicAuthentication(), basic),
+            }
+            results = {name: self.bench(authentication, header, options['repeat'], keys)
+                       for name, (authentication, header) in schemes.items()}
+            transaction.set_rollback(True)
+        cache.delete_many(keys)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('аутентификация одного запроса'))
+        for name, values in results.items():
+            self.stdout.write(f'{name:14} ' + ', '.join(f'{key}={value}' for key, value in values.items()))
+        if options['output']:
+            write_results(results, options['output'])
+            self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {options["output"]}'))
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.4 on 2026-10-17 18:37
+
+from django.db import migrations, models
+import users.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_user_telegram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='timezone',
+            field=models.CharField(default='UTC', max_length=63, validators=[users.validators.validate_timezone], verbose_name='часовой пояс'),
+        ),
+    ]
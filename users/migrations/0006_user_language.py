@@ -0,0 +1,18 @@
+# Generated by Django 4.2.4 on 2026-10-17 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_timezone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='language',
+            field=models.CharField(choices=[('ru', 'русский'), ('en', 'английский')], default='ru', max_length=8, verbose_name='язык напоминаний'),
+        ),
+    ]
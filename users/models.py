@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from users.validators import validate_timezone
+
 
 NULLABLE = {'blank': True, 'null': True}
 
@@ -11,6 +14,10 @@ class User(AbstractUser):
     email = models.EmailField(unique=True, verbose_name='email')
     is_active = models.BooleanField(default=True, verbose_name='user active')
     telegram = models.IntegerField(**NULLABLE, verbose_name='telegram id')
+    timezone = models.CharField(max_length=63, default='UTC', validators=[validate_timezone],
+                                verbose_name='часовой пояс')
+    language = models.CharField(max_length=8, choices=settings.REMINDER_LANGUAGES,
+                                default=settings.REMINDER_DEFAULT_LANGUAGE, verbose_name='язык напоминаний')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
@@ -1,3 +1,4 @@
+from asgiref.sync import sync_to_async
 from rest_framework import serializers
 from users.models import User
 
@@ -6,12 +7,23 @@ class CreateUserSerializer(serializers.ModelSerializer):
     """Сериализатор для создания нового пользователя"""
     class Meta:
         model = User
-        fields = ['email', 'password']
+        fields = ['email', 'password', 'timezone', 'language']
 
-    def create(self, validated_data):
+    def build_user(self, validated_data):
+        """Пользователь с захешированным паролем, ещё не записанный в БД"""
         password = validated_data.pop('password', None)
         instance = self.Meta.model(**validated_data)
         if password is not None:
             instance.set_password(password)
+        return instance
+
+    def create(self, validated_data):
+        instance = self.build_user(validated_data)
         instance.save()
         return instance
+
+    async def acreate(self, validated_data):
+        """Асинхронный вариант create, хеширование пароля нагружает процессор и выполняется в отдельном потоке"""
+        instance = await sync_to_async(self.build_user, thread_sensitive=False)(validated_data)
+        await instance.asave()
+        return instance
@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.caching import invalidate_user_cache
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_cache_on_change(sender, instance, **kwargs):
+    """Удаляет пользователя из кэша аутентификации после изменения, в том числе пароля и is_active, и удаления"""
+    invalidate_user_cache(instance.pk)
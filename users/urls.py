@@ -1,12 +1,13 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from users.apps import UsersConfig
-from users.views import UserCreateView
+from users.views import AsyncUserCreateView, UserCreateView
 
 app_name = UsersConfig.name
 
 urlpatterns = [
     path('create/', UserCreateView.as_view(), name='create_user'),
+    path('async/create/', AsyncUserCreateView.as_view(), name='async_create_user'),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
@@ -0,0 +1,16 @@
+from functools import cache
+from zoneinfo import available_timezones
+
+from django.core.exceptions import ValidationError
+
+
+@cache
+def get_timezone_names():
+    """Названия часовых поясов базы IANA, список читается с диска один раз на процесс"""
+    return frozenset(available_timezones())
+
+
+def validate_timezone(value):
+    """Валидатор проверяет, что value - название часового пояса из базы IANA, например Europe/Moscow"""
+    if value not in get_timezone_names():
+        raise ValidationError(f'Неизвестный часовой пояс: {value}')
@@ -1,5 +1,10 @@
+from asgiref.sync import sync_to_async
+from rest_framework import status
 from rest_framework.generics import CreateAPIView
 from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from habits.asyncapi import AsyncAPIView
 from users.models import User
 from users.serializers import CreateUserSerializer
 
@@ -9,3 +14,15 @@ class UserCreateView(CreateAPIView):
     serializer_class = CreateUserSerializer
     queryset = User.objects.all()
     permission_classes = [AllowAny]
+
+
+class AsyncUserCreateView(AsyncAPIView):
+    """Асинхронный контроллер создания нового пользователя"""
+    permission_classes = [AllowAny]
+
+    async def post(self, request, *args, **kwargs):
+        serializer = CreateUserSerializer(data=request.data, context=self.get_serializer_context())
+        # проверка уникальности email обращается к БД
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        instance = await serializer.acreate(dict(serializer.validated_data))
+        return Response(CreateUserSerializer(instance).data, status=status.HTTP_201_CREATED)